@@ -13,23 +13,43 @@
 #    under the License.
 
 import collections
+import contextlib
 import copy
-import datetime
+import functools
+import hashlib
 import logging
+from multiprocessing import pool
+import Queue
 import random
+import threading
+import time
+import urllib
+import uuid
 
 import django.conf
+import django.core.cache
+import django.core.exceptions
 import django.db.models
 from django.utils.translation import ugettext_lazy as _  # noqa
 from horizon import exceptions
+from horizon import messages
 import requests
 
 from novaclient.v1_1.contrib import baremetal
+from novaclient.v1_1 import servers
 from tuskarclient.v1 import client as tuskar_client
 
 from openstack_dashboard.api import base
 from openstack_dashboard.api import nova
 
+from tuskar_ui import exceptions as tuskar_exceptions
+from tuskar_ui import timeseries
+
+try:
+    import eventlet
+except ImportError:
+    eventlet = None
+
 
 LOG = logging.getLogger(__name__)
 TUSKAR_ENDPOINT_URL = getattr(django.conf.settings, 'TUSKAR_ENDPOINT_URL')
@@ -37,13 +57,277 @@ REMOTE_NOVA_BAREMETAL_CREDS = getattr(django.conf.settings,
                                       'REMOTE_NOVA_BAREMETAL_CREDS',
                                       False)
 OVERCLOUD_CREDS = getattr(django.conf.settings, 'OVERCLOUD_CREDS', False)
+CLIENT_POOL_SIZE = getattr(django.conf.settings, 'TUSKAR_CLIENT_POOL_SIZE',
+                           32)
+CLIENT_POOL_IDLE_TIMEOUT = getattr(django.conf.settings,
+                                   'TUSKAR_CLIENT_POOL_IDLE_TIMEOUT',
+                                   300)
+# Seconds Tuskar listings (and the overcloud VM counts) are kept in the shared
+# cache, per endpoint. Can be overridden with the TUSKAR_CACHE_TTLS setting,
+# 0 disables caching.
+DEFAULT_CACHE_TTLS = {'racks': 30,
+                      'resource_classes': 60,
+                      'flavors': 300,
+                      'nodes': 30,
+                      'overcloud_vm_counts': 30}
+# Seconds past their TTL cached listings are still served, while reloaded in
+# the background (the TUSKAR_CACHE_MAX_STALENESS setting).
+DEFAULT_CACHE_MAX_STALENESS = 60
+CACHE_GENERATION_TIMEOUT = 24 * 60 * 60
+# Units capacities can be converted between, scaled to the smallest one.
+CAPACITY_UNIT_SCALES = {'MB': 1,
+                        'GB': 1024,
+                        'TB': 1024 * 1024}
+# Servers fetched per call when walking the overcloud server listing.
+SERVER_PAGE_SIZE = getattr(django.conf.settings, 'API_RESULT_LIMIT', 1000)
+# Most backend calls a collection loader runs at once, see _fan_out. Can be
+# overridden with the TUSKAR_API_MAX_WORKERS setting, 1 runs them in turn.
+DEFAULT_MAX_WORKERS = 8
+# Seconds all the backend calls of a request may take (the
+# TUSKAR_REQUEST_BUDGET setting) and each one of them may take
+# (TUSKAR_CALL_TIMEOUT), 0 for no limit. Reads past these fail with
+# DeadlineExceeded, so pages show what they could load in time. Writes aren't
+# started once the budget is spent, but aren't cut short either.
+DEFAULT_REQUEST_BUDGET = 20
+DEFAULT_CALL_TIMEOUT = 10
+# Names of the client methods that only read, and so may be sent again when
+# they don't answer within the TUSKAR_HEDGE_DELAY setting (off by default).
+IDEMPOTENT_METHODS = ('get', 'list')
+# Failed calls in a row after which the calls to a backend endpoint fail
+# right away (the TUSKAR_BREAKER_FAILURES setting, 0 disables that), and
+# seconds after which one call is let through again to probe it
+# (TUSKAR_BREAKER_RESET_TIMEOUT).
+DEFAULT_BREAKER_FAILURES = 3
+DEFAULT_BREAKER_RESET_TIMEOUT = 30
+# Most answers to reads an endpoint's breaker keeps, to serve them while the
+# endpoint is down.
+BREAKER_LAST_GOOD_SIZE = 256
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+
+class ClientPool(object):
+    """Process-wide, thread-safe pool of backend clients.
+
+    Clients are keyed by endpoint and credentials. Reusing one keeps its
+    authentication state and its HTTP session, so repeated calls skip
+    client construction, endpoint resolution and new TCP/TLS handshakes.
+    At most ``size`` clients are kept (the least recently used one is
+    dropped first) and a client idle for more than ``idle_timeout``
+    seconds is rebuilt rather than reused.
+    """
+
+    def __init__(self, size, idle_timeout):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        # credentials are part of the key, don't keep them around in clear
+        return _digest(*parts)
+
+    def get(self, key, factory):
+        now = time.time()
+        with self._lock:
+            client, last_used = self._clients.get(key, (None, None))
+            if client is not None and now - last_used > self.idle_timeout:
+                client = None
+        if client is None:
+            client = factory()
+        with self._lock:
+            self._clients[key] = (client, now)
+            while len(self._clients) > self.size:
+                oldest = min(self._clients,
+                             key=lambda k: self._clients[k][1])
+                del self._clients[oldest]
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+CLIENT_POOL = ClientPool(CLIENT_POOL_SIZE, CLIENT_POOL_IDLE_TIMEOUT)
+
+
+class CircuitBreaker(object):
+    """Process-wide, thread-safe circuit breaker of a backend endpoint.
+
+    After ``failure_threshold`` failed calls in a row the circuit opens:
+    calls fail right away with CircuitOpen, or get the last answer to the
+    same read, rather than waiting for the endpoint to time out. After
+    ``reset_timeout`` seconds the circuit is half open and a single call
+    probes the endpoint, closing the circuit if it succeeds. Errors the
+    endpoint answers with (HTTP status below 500) aren't failures.
+
+    State changes are logged and recorded in the ``state`` time series of
+    ``circuit_breaker-<name>`` (0 closed, 0.5 half open, 1 open); ``stats``
+    counts the calls.
+    """
+    CLOSED = 'closed'
+    HALF_OPEN = 'half open'
+    OPEN = 'open'
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.stats = {'calls': 0, 'failures': 0, 'rejected': 0,
+                      'served_last_good': 0}
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        # key: (answer, when it was last used), see _keep
+        self._last_good = {}
+        self._uses = 0
+        self._lock = threading.Lock()
+
+    def call(self, func, key=None, request=None):
+        """Returns ``func()``, unless the circuit is open. ``key``
+        identifies reads, whose answers are kept for then. It has to name
+        the client method, its arguments and the credentials it's called
+        with, since the answers are served to any request.
+        """
+        with self._lock:
+            self.stats['calls'] += 1
+            allowed = self._allow()
+        if not allowed:
+            return self._reject(key, request)
+        try:
+            result = func()
+        except tuskar_exceptions.DeadlineExceeded:
+            deadline = _deadline(request)
+            if deadline is not None and time.time() >= deadline:
+                # the request ran out of time, not the endpoint
+                self._done(None)
+            else:
+                self._done(False)
+            raise
+        except Exception as e:
+            code = getattr(e, 'code', None)
+            self._done(isinstance(code, int) and code < 500)
+            raise
+        self._done(True)
+        if key is not None:
+            with self._lock:
+                self._keep(key, result)
+        return result
+
+    def _keep(self, key, result):
+        # the least recently used answer is dropped first
+        self._uses += 1
+        self._last_good[key] = (result, self._uses)
+        while len(self._last_good) > BREAKER_LAST_GOOD_SIZE:
+            oldest = min(self._last_good,
+                         key=lambda k: self._last_good[k][1])
+            del self._last_good[oldest]
+
+    def _allow(self):
+        if self.state == self.OPEN:
+            if time.time() - self._opened_at < self.reset_timeout:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def _done(self, succeeded):
+        # None when the call tells nothing of the endpoint
+        with self._lock:
+            self._probing = False
+            if succeeded is None:
+                return
+            if succeeded:
+                self._failures = 0
+                if self.state != self.CLOSED:
+                    self._set_state(self.CLOSED)
+                return
+            self.stats['failures'] += 1
+            self._failures += 1
+            if (self.state == self.HALF_OPEN or
+                    self._failures >= self.failure_threshold):
+                self._opened_at = time.time()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def _reject(self, key, request):
+        _degrade(request, unavailable=True)
+        with self._lock:
+            self.stats['rejected'] += 1
+            if key in self._last_good:
+                self.stats['served_last_good'] += 1
+                result = self._last_good[key][0]
+                self._keep(key, result)
+                return result
+        raise tuskar_exceptions.CircuitOpen('%s is unavailable' % self.name)
+
+    def _set_state(self, state):
+        LOG.warning('Circuit breaker of %s: %s -> %s', self.name,
+                    self.state, state)
+        self.state = state
+        try:
+            timeseries.record('circuit_breaker-%s' % self.name, 'state',
+                              self._STATE_VALUES[state])
+        except EnvironmentError:
+            LOG.exception('Unable to record the circuit breaker state.')
+
+
+BREAKERS = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker(*endpoint):
+    """Returns the circuit breaker of ``endpoint`` (parts naming it), or
+    None if they're disabled.
+    """
+    threshold = getattr(django.conf.settings, 'TUSKAR_BREAKER_FAILURES',
+                        DEFAULT_BREAKER_FAILURES)
+    if not threshold:
+        return None
+    name = ' '.join([str(part) for part in endpoint])
+    with _breakers_lock:
+        if name not in BREAKERS:
+            BREAKERS[name] = CircuitBreaker(
+                name, threshold,
+                getattr(django.conf.settings, 'TUSKAR_BREAKER_RESET_TIMEOUT',
+                        DEFAULT_BREAKER_RESET_TIMEOUT))
+        return BREAKERS[name]
 
 
 # FIXME: request isn't used right in the tuskar client right now, but looking
 # at other clients, it seems like it will be in the future
 def tuskarclient(request):
-    c = tuskar_client.Client(TUSKAR_ENDPOINT_URL)
-    return c
+    return _budgeted(request, CLIENT_POOL.get(
+        ClientPool.key('tuskar', TUSKAR_ENDPOINT_URL),
+        lambda: tuskar_client.Client(TUSKAR_ENDPOINT_URL)))
+
+
+def _baremetal_key(request):
+    """Key of the endpoint and credentials of the baremetal client of
+    ``request``.
+    """
+    if REMOTE_NOVA_BAREMETAL_CREDS:
+        return ClientPool.key('baremetal',
+                              REMOTE_NOVA_BAREMETAL_CREDS['auth_url'],
+                              REMOTE_NOVA_BAREMETAL_CREDS['bypass_url'],
+                              REMOTE_NOVA_BAREMETAL_CREDS['user'],
+                              REMOTE_NOVA_BAREMETAL_CREDS['password'],
+                              REMOTE_NOVA_BAREMETAL_CREDS['tenant'])
+    return ClientPool.key('baremetal',
+                          request.user.token.id,
+                          request.user.tenant_id,
+                          getattr(request.user, 'services_region', None))
 
 
 def baremetalclient(request):
@@ -56,41 +340,810 @@ def baremetalclient(request):
         return nc
 
     def create_nova_client_baremetal():
+        # the service catalog comes with the token, so the endpoint is only
+        # resolved when the first client for a token is created
+        compute_url = base.url_for(request, 'compute')
         insecure = getattr(django.conf.settings, 'OPENSTACK_SSL_NO_VERIFY',
                            False)
         nc = nova.nova_client.Client(
                 request.user.username,
                 request.user.token.id,
                 project_id=request.user.tenant_id,
-                auth_url=base.url_for(request, 'compute'),
+                auth_url=compute_url,
                 insecure=insecure,
                 http_log_debug=django.conf.settings.DEBUG)
         nc.client.auth_token = request.user.token.id
-        nc.client.management_url = base.url_for(request, 'compute')
+        nc.client.management_url = compute_url
 
+        LOG.debug('nova baremetal client connection created using token "%s" '
+                  'and url "%s"' % (request.user.token.id, compute_url))
         return nc
 
     if REMOTE_NOVA_BAREMETAL_CREDS:
-        LOG.debug('remote nova baremetal client connection created')
-        nc = create_remote_nova_client_baremetal()
+        def create_client():
+            LOG.debug('remote nova baremetal client connection created')
+            return create_remote_nova_client_baremetal()
+        nc = CLIENT_POOL.get(_baremetal_key(request), create_client)
+        breaker = _breaker('baremetal',
+                           REMOTE_NOVA_BAREMETAL_CREDS['bypass_url'])
     else:
-        LOG.debug('nova baremetal client connection created using token "%s" '
-                  'and url "%s"' %
-                  (request.user.token.id, base.url_for(request, 'compute')))
-        nc = create_nova_client_baremetal()
+        nc = CLIENT_POOL.get(_baremetal_key(request),
+                             create_nova_client_baremetal)
+        breaker = _breaker('baremetal',
+                           getattr(request.user, 'services_region', None))
 
-    return baremetal.BareMetalNodeManager(nc)
+    return _budgeted(request, baremetal.BareMetalNodeManager(nc), breaker,
+                     (_baremetal_key(request),))
 
 
 def overcloudclient(request):
-    c = nova.nova_client.Client(OVERCLOUD_CREDS['user'],
-                                OVERCLOUD_CREDS['password'],
-                                OVERCLOUD_CREDS['tenant'],
-                                auth_url=OVERCLOUD_CREDS['auth_url'])
-    return c
+    def create_client():
+        return nova.nova_client.Client(OVERCLOUD_CREDS['user'],
+                                       OVERCLOUD_CREDS['password'],
+                                       OVERCLOUD_CREDS['tenant'],
+                                       auth_url=OVERCLOUD_CREDS['auth_url'])
+    key = ClientPool.key('overcloud',
+                         OVERCLOUD_CREDS['auth_url'],
+                         OVERCLOUD_CREDS['user'],
+                         OVERCLOUD_CREDS['password'],
+                         OVERCLOUD_CREDS['tenant'])
+    return _budgeted(request, CLIENT_POOL.get(key, create_client),
+                     _breaker('overcloud', OVERCLOUD_CREDS['auth_url']),
+                     (key,))
+
+
+# Set in the threads working for a request after it, such as refreshes of
+# cached listings and rack imports, which neither its time budget nor its
+# warnings apply to any more.
+_background = threading.local()
+
+
+def _detached():
+    return getattr(_background, 'detached', False)
+
+
+@contextlib.contextmanager
+def detached():
+    """Makes the backend calls done in it, and in the threads they fan out
+    to, outside of the time budget of the request they are done for, and
+    without warning it. For work going on in the background.
+    """
+    previous = _detached()
+    _background.detached = True
+    try:
+        yield
+    finally:
+        _background.detached = previous
+
+
+def _deadline(request):
+    """Returns the time by which the backend calls of ``request`` have to
+    be done, counted from the first one, or None.
+    """
+    if request is None or _detached():
+        return None
+    deadline = getattr(request, '_tuskar_deadline', None)
+    if deadline is None:
+        budget = getattr(django.conf.settings, 'TUSKAR_REQUEST_BUDGET',
+                         DEFAULT_REQUEST_BUDGET)
+        if not budget:
+            return None
+        deadline = request._tuskar_deadline = time.time() + budget
+    return deadline
+
+
+def _degrade(request, unavailable=False):
+    """Tells the user, once per request, that the page lacks some data
+    which took too long to load or, when ``unavailable``, whose service is
+    down.
+    """
+    flag = unavailable and '_tuskar_unavailable' or '_tuskar_degraded'
+    if request is None or getattr(request, flag, False) or _detached():
+        return
+    setattr(request, flag, True)
+    if unavailable:
+        message = _("Some data is missing because a service is "
+                    "unavailable, the page may be incomplete.")
+    else:
+        message = _("Some data took too long to load and is missing, the "
+                    "page may be incomplete.")
+    messages.warning(request, message, fail_silently=True)
+
+
+def _call_within(timeout, hedge_delay, func, args, kwargs):
+    """Calls ``func`` in another thread and returns what it returns, or
+    raises DeadlineExceeded after ``timeout`` seconds. Calls it once more
+    if it hasn't returned after ``hedge_delay`` seconds, the first answer
+    wins.
+    """
+    outcomes = Queue.Queue()
+
+    def attempt():
+        try:
+            outcomes.put((func(*args, **kwargs), None))
+        except Exception as e:
+            outcomes.put((None, e))
+
+    def start():
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+
+    end = time.time() + timeout
+    start()
+    pending = 1
+    error = None
+    while pending:
+        wait = end - time.time()
+        hedge = hedge_delay and pending == 1 and error is None
+        if hedge:
+            wait = min(wait, hedge_delay)
+        try:
+            if wait <= 0:
+                raise Queue.Empty()
+            result, error = outcomes.get(timeout=wait)
+        except Queue.Empty:
+            if hedge and end > time.time():
+                hedge_delay = None
+                start()
+                pending += 1
+                continue
+            raise tuskar_exceptions.DeadlineExceeded(
+                'No answer within %.1f seconds' % timeout)
+        pending -= 1
+        if error is None:
+            return result
+    raise error
+
+
+def _remaining(request):
+    """Returns the seconds left of the budget of ``request``, or None if
+    it has none. Raises DeadlineExceeded when it's spent.
+    """
+    deadline = _deadline(request)
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        _degrade(request)
+        raise tuskar_exceptions.DeadlineExceeded('The request ran out of time')
+    return remaining
+
+
+def _budgeted_call(request, idempotent, func, *args, **kwargs):
+    """Calls ``func`` within the per-call timeout and what is left of the
+    budget of ``request``, hedging it, when ``idempotent``. Other calls are
+    only not made once the budget is spent.
+    """
+    timeout = getattr(django.conf.settings, 'TUSKAR_CALL_TIMEOUT',
+                      DEFAULT_CALL_TIMEOUT)
+    remaining = _remaining(request)
+    if not idempotent:
+        # a write left running would still take effect after the caller was
+        # told it failed
+        return func(*args, **kwargs)
+    if remaining is not None:
+        timeout = min(timeout or remaining, remaining)
+    if not timeout:
+        return func(*args, **kwargs)
+    hedge_delay = getattr(django.conf.settings, 'TUSKAR_HEDGE_DELAY', None)
+    try:
+        return _call_within(timeout, hedge_delay, func, args, kwargs)
+    except tuskar_exceptions.DeadlineExceeded:
+        LOG.warning('%r ran out of time', func)
+        _degrade(request)
+        raise
+
+
+def _guarded_call(request, breaker, scope, name, func, *args, **kwargs):
+    """Calls ``func`` (the ``name`` method of a client) within the budget
+    of ``request`` and through ``breaker``, if any. ``scope`` names the
+    client's credentials and the method, for the breaker to keep reads by.
+    """
+    idempotent = name in IDEMPOTENT_METHODS
+
+    def call():
+        return _budgeted_call(request, idempotent, func, *args, **kwargs)
+    if breaker is None:
+        return call()
+    # a spent budget isn't the endpoint's failure, don't tell the breaker
+    _remaining(request)
+    key = None
+    if idempotent:
+        key = (scope, repr(args), repr(sorted(kwargs.items())))
+    return breaker.call(call, key, request)
+
+
+class _Budgeted(object):
+    """Proxy of a backend client (or of one of its managers or methods)
+    making every call through _guarded_call for ``request``. ``scope``
+    names the credentials of the client, followed by the attributes taken
+    from it.
+    """
+    _PLAIN_TYPES = (basestring, int, long, float, bool, list, tuple, dict,
+                    type(None))
+
+    def __init__(self, target, request, name=None, breaker=None, scope=()):
+        self._target = target
+        self._request = request
+        self._name = name
+        self._breaker = breaker
+        self._scope = scope
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if isinstance(value, self._PLAIN_TYPES):
+            return value
+        return _Budgeted(value, self._request, name, self._breaker,
+                         self._scope + (name,))
+
+    def __call__(self, *args, **kwargs):
+        return _guarded_call(self._request, self._breaker, self._scope,
+                             self._name, self._target, *args, **kwargs)
+
+
+def _budgeted(request, client, breaker=None, scope=()):
+    if breaker is None and not (
+            getattr(django.conf.settings, 'TUSKAR_CALL_TIMEOUT',
+                    DEFAULT_CALL_TIMEOUT) or _deadline(request)):
+        return client
+    return _Budgeted(client, request, breaker=breaker, scope=scope)
+
+
+def _identity_map(request):
+    """Returns the identity map bound to ``request``.
+
+    Within one request the wrappers below keep every object they load in
+    this map, so the same id always resolves to the same wrapper and each
+    backend GET runs at most once. Without a request nothing is kept.
+    """
+    if request is None:
+        return {}
+    identity_map = getattr(request, '_tuskar_identity_map', None)
+    if identity_map is None:
+        identity_map = request._tuskar_identity_map = {}
+    return identity_map
+
+
+def _memoize(request, key, loader):
+    identity_map = _identity_map(request)
+    if key not in identity_map:
+        identity_map[key] = loader()
+    return identity_map[key]
+
+
+def _invalidate(request, *endpoints):
+    """Forgets everything loaded so far in ``request`` and drops the
+    cached listings of ``endpoints``.
+
+    Called after every write (see _writing), since a single write may
+    change several related objects (e.g. updating a rack changes its
+    resource class' racks).
+    """
+    _identity_map(request).clear()
+    for endpoint in endpoints:
+        django.core.cache.cache.set(_cache_key('generation', endpoint),
+                                    uuid.uuid4().hex,
+                                    CACHE_GENERATION_TIMEOUT)
+
+
+@contextlib.contextmanager
+def _writing(request, *endpoints):
+    """Runs the writes done in it, then invalidates ``endpoints`` for
+    ``request``. Failed writes too, since they may have taken effect anyway.
+    """
+    try:
+        yield
+    finally:
+        _invalidate(request, *endpoints)
+
+
+class _Flight(object):
+    """A backend read in progress, shared by the threads waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+# errors of a read that only tell about the request it was made for
+REQUEST_ERRORS = (tuskar_exceptions.DeadlineExceeded,
+                  tuskar_exceptions.CircuitOpen)
+
+
+def _coalesce(request, key, loader):
+    """Returns ``loader()``, a backend read for ``request``.
+
+    Threads of the process reading the same ``key`` (which has to name the
+    endpoint, the arguments and whose credentials they are read with) while
+    it is in progress don't call ``loader`` again: they wait for the first
+    one and get the same result, or error. Callers mustn't change it.
+
+    They wait no longer than the budget of their own request, and call
+    ``loader`` themselves when the first one ran out of time.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        flight.done.wait(_remaining(request))
+        if not flight.done.is_set():
+            _degrade(request)
+            raise tuskar_exceptions.DeadlineExceeded(
+                'The request ran out of time')
+        if isinstance(flight.error, REQUEST_ERRORS):
+            return loader()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = loader()
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    return flight.result
+
+
+def _cache_key(*parts):
+    return 'tuskar_ui.api.%s' % _digest(TUSKAR_ENDPOINT_URL, *parts)
+
+
+def _cache_generation(endpoint):
+    # Every endpoint's entries are keyed by its current generation, so a
+    # write drops all of them (e.g. the flavors of every resource class) at
+    # once. Should the generation itself be evicted, a new one is picked,
+    # which can't resurrect entries stored under the old one.
+    key = _cache_key('generation', endpoint)
+    generation = django.core.cache.cache.get(key)
+    if generation is None:
+        django.core.cache.cache.add(key, uuid.uuid4().hex,
+                                    CACHE_GENERATION_TIMEOUT)
+        generation = django.core.cache.cache.get(key)
+    return generation
+
+
+def _cache_ttl(endpoint):
+    return getattr(django.conf.settings, 'TUSKAR_CACHE_TTLS',
+                   {}).get(endpoint, DEFAULT_CACHE_TTLS[endpoint])
+
+
+def _cache_max_staleness():
+    return getattr(django.conf.settings, 'TUSKAR_CACHE_MAX_STALENESS',
+                   DEFAULT_CACHE_MAX_STALENESS)
+
+
+def _cached_list(request, endpoint, loader, *args):
+    """Returns ``loader(*args)``, a listing read for ``request``, through
+    the cache shared by all requests.
+
+    A listing older than its TTL, but by less than the max staleness, is
+    still returned right away, while it's reloaded in the background.
+    """
+    key = _list_cache_key(endpoint, *args)
+
+    def refresh():
+        return _load_list(key, endpoint, loader, *args)
+    ttl = _cache_ttl(endpoint)
+    if ttl:
+        cached = django.core.cache.cache.get(key)
+        if cached is not None:
+            stored_at, entries = cached
+            if time.time() - stored_at >= ttl:
+                _revalidate(key, refresh)
+            # resources are cached without their manager (and so without
+            # the HTTP client), which is all the wrappers need
+            return [resource_class(None, info)
+                    for resource_class, info in entries]
+    # a write picks a new generation, so it's never read from a listing
+    # started before it
+    return _coalesce(request, key, refresh)
+
+
+def _list_cache_key(endpoint, *args):
+    return _cache_key(endpoint, _cache_generation(endpoint), *args)
+
+
+def _refresh_list(endpoint, loader, *args):
+    """Returns ``loader(*args)`` after storing it in the shared cache,
+    whatever is cached already.
+    """
+    return _load_list(_list_cache_key(endpoint, *args), endpoint, loader,
+                      *args)
+
+
+def _load_list(key, endpoint, loader, *args):
+    """Returns ``loader(*args)`` after storing it under ``key``.
+
+    The key is taken before loading, so a listing started before a write
+    is stored under the generation the write dropped, never after it.
+    """
+    resources = loader(*args)
+    ttl = _cache_ttl(endpoint)
+    if ttl:
+        django.core.cache.cache.set(
+            key, (time.time(), [(r.__class__, r._info) for r in resources]),
+            ttl + _cache_max_staleness())
+    return resources
+
 
+_revalidating = set()
+_revalidating_lock = threading.Lock()
 
-class StringIdAPIResourceWrapper(base.APIResourceWrapper):
+
+def _revalidate(key, refresh):
+    """Runs ``refresh``, reloading the cached listing under ``key``, in a
+    background thread unless one already does.
+    """
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            with detached():
+                _coalesce(None, key, refresh)
+        except Exception:
+            LOG.exception('Unable to refresh a cached listing.')
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+    if getattr(django.conf.settings, 'TUSKAR_BACKGROUND_JOBS', True):
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    else:
+        run()
+
+
+def _list_flavors(request, resource_class_id):
+    return _memoize(request, ('Flavor.list', str(resource_class_id)),
+                    lambda: _cached_list(
+                        request, 'flavors',
+                        lambda rc_id: tuskarclient(request).flavors.list(
+                            rc_id),
+                        resource_class_id))
+
+
+def _list_nodes(request):
+    return _memoize(request, ('Node.list',), lambda: _cached_list(
+        request, 'nodes', lambda key: baremetalclient(request).list(),
+        _baremetal_key(request)))
+
+
+def _server_list(request, search_opts=None):
+    """Iterates over the Nova servers of all tenants, following the marker
+    from page to page, so only one page is held in memory at a time.
+    """
+    region = getattr(request.user, 'services_region', None)
+    scope = (ClientPool.key('nova', request.user.token.id,
+                            request.user.tenant_id, region),
+             'servers', 'list')
+    marker = None
+    while True:
+        opts = dict(search_opts or {}, paginate=True)
+        if marker:
+            opts['marker'] = marker
+        # the request isn't an argument of the call, the breaker keeps the
+        # last pages by the token they were read with and their options
+        page, more = _guarded_call(
+            request, _breaker('nova', region), scope, 'list',
+            functools.partial(nova.server_list, request),
+            search_opts=opts, all_tenants=True)
+        for server in page:
+            yield server
+        if not (more and page):
+            break
+        marker = page[-1].id
+
+
+# What nodes show of the instance deployed on them.
+InstanceDetails = collections.namedtuple('InstanceDetails',
+                                         ['addresses', 'vm_state'])
+
+
+def _overcloud_servers(request):
+    """Iterates over the servers of all overcloud tenants as the plain
+    dicts the API returns, fetching one page of them at a time.
+
+    Nova may return fewer servers than asked for (it caps pages at its
+    osapi_max_limit), so pages are followed for as long as they link to
+    a next one.
+    """
+    client = overcloudclient(request).client
+    marker = None
+    while True:
+        query = {'all_tenants': True, 'limit': SERVER_PAGE_SIZE}
+        if marker:
+            query['marker'] = marker
+        resp, body = client.get('/servers/detail?%s' %
+                                urllib.urlencode(query))
+        page = body['servers']
+        for server in page:
+            yield server
+        links = body.get('servers_links') or []
+        if not page or 'next' not in [link.get('rel') for link in links]:
+            break
+        marker = page[-1]['id']
+
+
+def _overcloud_servers_by_host(request):
+    """Index of the overcloud servers by hostId, built from one walk over
+    the server listing and shared by every node of the request.
+    """
+    def build_index():
+        manager = overcloudclient(request).servers
+        index = collections.defaultdict(list)
+        for info in _overcloud_servers(request):
+            index[info['hostId']].append(
+                servers.Server(manager, info, loaded=True))
+        return dict(index)
+    return _memoize(request, ('Overcloud.servers_by_host',), build_index)
+
+
+def _overcloud_vm_counts(request):
+    """Number of overcloud servers per hostId.
+
+    Only counts the hosts of the raw listing, without building server
+    objects, and keeps the counts in the shared cache.
+    """
+    def count():
+        if ('Overcloud.servers_by_host',) in _identity_map(request):
+            return dict((host, len(host_servers)) for host, host_servers in
+                        _overcloud_servers_by_host(request).items())
+        counts = None
+        if _cache_ttl('overcloud_vm_counts'):
+            counts = django.core.cache.cache.get(
+                _cache_key('overcloud_vm_counts', OVERCLOUD_CREDS['auth_url']))
+        if counts is None:
+            counts = _coalesce(
+                request, ('overcloud_vm_counts', OVERCLOUD_CREDS['auth_url']),
+                lambda: _refresh_overcloud_vm_counts(request))
+        return counts
+    return _memoize(request, ('Overcloud.vm_counts',), count)
+
+
+def _refresh_overcloud_vm_counts(request):
+    """Counts the overcloud servers per hostId and stores the counts in the
+    shared cache, whatever is cached already.
+    """
+    counts = collections.defaultdict(int)
+    for info in _overcloud_servers(request):
+        counts[info['hostId']] += 1
+    counts = dict(counts)
+    ttl = _cache_ttl('overcloud_vm_counts')
+    if ttl:
+        django.core.cache.cache.set(
+            _cache_key('overcloud_vm_counts', OVERCLOUD_CREDS['auth_url']),
+            counts, ttl)
+    return counts
+
+
+def _run_concurrently(calls, max_workers):
+    """Runs ``calls`` (functions taking no argument), at most
+    ``max_workers`` at a time, and returns their results in order.
+
+    They run in OS threads, or in green threads when the
+    TUSKAR_API_CONCURRENCY setting is 'eventlet', which requires a server
+    running with eventlet's monkey patching (e.g. gunicorn's eventlet
+    workers) so that their HTTP calls yield to each other.
+    """
+    if max_workers <= 1:
+        return [call() for call in calls]
+    in_background = _detached()
+
+    def run(call):
+        if not in_background:
+            return call()
+        with detached():
+            return call()
+    mode = getattr(django.conf.settings, 'TUSKAR_API_CONCURRENCY', 'threads')
+    if mode == 'eventlet':
+        if eventlet is None:
+            raise django.core.exceptions.ImproperlyConfigured(
+                "TUSKAR_API_CONCURRENCY is 'eventlet', but eventlet isn't "
+                "installed.")
+        return list(eventlet.GreenPool(max_workers).imap(run, calls))
+    workers = pool.ThreadPool(max_workers)
+    try:
+        return workers.map(run, calls)
+    finally:
+        workers.close()
+        workers.join()
+
+
+def _max_workers(count):
+    return min(getattr(django.conf.settings, 'TUSKAR_API_MAX_WORKERS',
+                       DEFAULT_MAX_WORKERS), count)
+
+
+def _fan_out(func, items):
+    """Calls ``func`` on each of ``items`` concurrently, through a bounded
+    pool of threads (see _run_concurrently).
+
+    Returns ``(results, errors)``: ``results`` is in the order of ``items``
+    with ``None`` for the items ``func`` failed on, ``errors`` lists
+    ``(item, exception)`` for those, so one failing backend call doesn't
+    abort the whole collection.
+    """
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            LOG.warning('Loading %r failed: %s', item, e)
+            return None, e
+
+    items = list(items)
+    outcomes = _run_concurrently([lambda item=item: call(item)
+                                  for item in items],
+                                 _max_workers(len(items)))
+    results = [result for result, error in outcomes]
+    errors = [(item, error) for item, (result, error) in zip(items, outcomes)
+              if error is not None]
+    return results, errors
+
+
+def _gather(*loaders):
+    """Runs independent ``loaders`` (functions taking no argument)
+    concurrently and returns their results, in order. Raises the error of
+    the first one that failed, once all of them are done.
+
+    The loaders may register objects in the identity map of a request, as
+    long as no two of them register the same ones.
+    """
+    def call(loader):
+        try:
+            return loader(), None
+        except Exception as e:
+            return None, e
+
+    outcomes = _run_concurrently([lambda loader=loader: call(loader)
+                                  for loader in loaders],
+                                 _max_workers(len(loaders)))
+    for result, error in outcomes:
+        if error is not None:
+            raise error
+    return [result for result, error in outcomes]
+
+
+def warm_cache():
+    """Reloads the Tuskar listings (and the overcloud VM counts and, with
+    REMOTE_NOVA_BAREMETAL_CREDS, the baremetal nodes) cached in the shared
+    cache, so that requests find them there.
+
+    Runs the loaders the wrappers use, outside of any request. Returns the
+    number of objects loaded per endpoint; raises the first error, after
+    refreshing what could be.
+    """
+    client = tuskarclient(None)
+    loaded = {}
+    resource_classes = _refresh_list(
+        'resource_classes', lambda: client.resource_classes.list())
+    loaded['resource_classes'] = len(resource_classes)
+    loaded['racks'] = len(_refresh_list('racks', lambda: client.racks.list()))
+    flavor_lists, errors = _fan_out(
+        lambda rc_id: _refresh_list(
+            'flavors', lambda rc_id: client.flavors.list(rc_id), rc_id),
+        [str(rc.id) for rc in resource_classes])
+    loaded['flavors'] = sum([len(flavors) for flavors in flavor_lists
+                             if flavors is not None])
+    if REMOTE_NOVA_BAREMETAL_CREDS:
+        # otherwise the nodes are cached per user token, which only
+        # requests have
+        loaded['nodes'] = len(_refresh_list(
+            'nodes', lambda key: baremetalclient(None).list(),
+            _baremetal_key(None)))
+    if OVERCLOUD_CREDS:
+        loaded['overcloud_vm_counts'] = sum(
+            _refresh_overcloud_vm_counts(None).values())
+    if errors:
+        raise errors[0][1]
+    return loaded
+
+
+class _RecordType(type):
+    """Gives every wrapper class a slot for each field of its ``_attrs``.
+
+    A field the class shadows with a property or method of the same name
+    (e.g. ``id``) is kept in a ``_raw_<field>`` slot for it to read.
+    """
+    def __new__(mcs, name, bases, attrs):
+        slotted = set()
+        for base_class in bases:
+            for klass in base_class.__mro__:
+                slotted.update(getattr(klass, '__slots__', ()))
+        if '_attrs' in attrs:
+            fields = []
+            for field in attrs['_attrs']:
+                shadowed = field in attrs or any(
+                    hasattr(b, field) and field not in slotted for b in bases)
+                fields.append((field, '_raw_%s' % field if shadowed
+                               else field))
+            attrs['_fields'] = tuple(fields)
+        slots = list(attrs.get('__slots__', ()))
+        for field, slot in attrs.get('_fields', ()):
+            if slot not in slotted and slot not in slots:
+                slots.append(slot)
+        attrs['__slots__'] = tuple(slots)
+        return super(_RecordType, mcs).__new__(mcs, name, bases, attrs)
+
+
+def _capacity_value(capacity, unit):
+    """Returns the value of ``capacity`` in ``unit``, or None if it isn't
+    a number or can't be converted.
+    """
+    try:
+        value = float(capacity.value)
+    except (TypeError, ValueError):
+        return None
+    if capacity.unit == unit:
+        return value
+    if capacity.unit in CAPACITY_UNIT_SCALES and unit in CAPACITY_UNIT_SCALES:
+        return (value * CAPACITY_UNIT_SCALES[capacity.unit] /
+                CAPACITY_UNIT_SCALES[unit])
+    LOG.warning('Capacity %s: can\'t convert %s to %s',
+                capacity.name, capacity.unit, unit)
+    return None
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else value
+
+
+def _aggregate_capacities(capacity_lists):
+    """Aggregates the capacities of ``capacity_lists`` (e.g. those of each
+    rack of a resource class) by name.
+
+    Values are converted to the unit their name first comes with (for
+    MB/GB/TB). Returns a Capacity per name, its ``value`` being the total,
+    with the ``min``, ``max`` and ``mean`` of the lists that have it.
+    """
+    names = []
+    units = {}
+    columns = {}
+    rows = []
+    for capacities in capacity_lists:
+        row = []
+        for capacity in capacities:
+            if capacity.name not in columns:
+                columns[capacity.name] = len(names)
+                names.append(capacity.name)
+                units[capacity.name] = capacity.unit
+            value = _capacity_value(capacity, units[capacity.name])
+            if value is not None:
+                row.append((columns[capacity.name], value))
+        rows.append(row)
+    if not names:
+        return []
+
+    values = [[] for name in names]
+    for row in rows:
+        for j, value in row:
+            values[j].append(value)
+    stats = [(sum(v), min(v or [0]), max(v or [0]), len(v)) for v in values]
+
+    return [Capacity({'name': name,
+                      'value': _number(total),
+                      'unit': units[name],
+                      'min': _number(minimum),
+                      'max': _number(maximum),
+                      'mean': total / count})
+            for name, (total, minimum, maximum, count) in zip(names, stats)
+            if count]
+
+
+class StringIdAPIResourceWrapper(object):
     # horizon DataTable class expects ids to be string,
     # if it's not string, then comparison in
     # horizon/tables/base.py:get_object_by_id fails.
@@ -98,25 +1151,49 @@ class StringIdAPIResourceWrapper(base.APIResourceWrapper):
     # (luckily django autoconverts strings to integers when passing string to
     # django model id)
 
+    # Wrappers copy the fields listed in _attrs out of the resource they wrap
+    # (a tuskarclient/novaclient resource or a dict) into slots, and don't
+    # keep the resource itself, nor its manager and HTTP client. Whatever
+    # else gets set on them (e.g. cached relations) goes to __dict__.
+    __metaclass__ = _RecordType
+    __slots__ = ('_request', '__dict__')
+    _attrs = []
+
     def __init__(self, apiresource, request=None):
         self.request = request
-        self._apiresource = apiresource
-
-    # FIXME
-    # this is redefined from base.APIResourceWrapper,
-    # remove this when tuskarclient returns object instead of dict
-    def __getattr__(self, attr):
-        if attr in self._attrs:
-            if issubclass(self._apiresource.__class__, dict):
-                return self._apiresource.get(attr)
-            else:
-                return self._apiresource.__getattribute__(attr)
+        if isinstance(apiresource, dict):
+            values = apiresource
         else:
-            raise AttributeError(attr)
+            try:
+                # read what was loaded, a resource's __getattr__ would
+                # fetch it again for each missing field
+                values = vars(apiresource)
+            except TypeError:
+                values = dict((field, getattr(apiresource, field, None))
+                              for field, slot in self._fields)
+        for field, slot in self._fields:
+            setattr(self, slot, values.get(field))
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__,
+                             dict((field, getattr(self, slot))
+                                  for field, slot in self._fields))
 
     @property
     def id(self):
-        return str(self._apiresource.id)
+        return str(self._raw_id)
+
+    @classmethod
+    def _identity_key(cls, object_id):
+        return (cls.__name__, str(object_id))
+
+    @classmethod
+    def _identity(cls, request, apiresource):
+        """Wraps ``apiresource``, reusing the wrapper already loaded in
+        ``request`` for the same id.
+        """
+        return _memoize(request, cls._identity_key(apiresource.id),
+                        lambda: cls(apiresource, request))
 
     # FIXME: self.request is required when calling some instance
     # methods (e.g. list_flavors), once we really start using this request
@@ -141,22 +1218,24 @@ class Capacity(StringIdAPIResourceWrapper):
     """Wrapper for the Capacity object returned by the
     dummy model.
     """
-    _attrs = ['name', 'value', 'unit']
+    _attrs = ['name', 'value', 'unit', 'min', 'max', 'mean']
+
+    # object whose usage is looked up in the time series store, e.g.
+    # 'rack-1'; set by the wrappers listing their capacities
+    object_id = 'overall'
 
-    # defines a random usage of capacity - API should probably be able to
-    # determine usage of capacity based on capacity value and obejct_id
     @property
     def usage(self):
         if not hasattr(self, '_usage'):
-            self._usage = random.randint(0, int(self.value))
+            self._usage = _number(
+                round(timeseries.latest(self.object_id, self.name) or 0, 2))
         return self._usage
 
-    # defines a random average of capacity - API should probably be able to
-    # determine average of capacity based on capacity value and obejct_id
     @property
     def average(self):
         if not hasattr(self, '_average'):
-            self._average = random.randint(0, int(self.value))
+            self._average = _number(
+                round(timeseries.average(self.object_id, self.name) or 0, 2))
         return self._average
 
 
@@ -165,65 +1244,118 @@ class Node(StringIdAPIResourceWrapper):
     dummy model.
     """
     _attrs = ['id', 'pm_address', 'cpus', 'memory_mb', 'service_host',
-              'local_gb', 'pm_user']
+              'local_gb', 'pm_user', 'interfaces']
 
     @classmethod
     def get(cls, request, node_id):
+        return _memoize(request, cls._identity_key(node_id),
+                        lambda: cls._get(request, node_id))
+
+    @classmethod
+    def _get(cls, request, node_id):
         node = cls(baremetalclient(request).get(node_id))
         node.request = request
+        node._set_instance_details(cls._instance_details(request, node_id))
+        return node
 
-        # FIXME ugly, fix after demo, make abstraction of instance details
-        # this is realy not optimal, but i dont hve time do fix it now
-        instances, more = nova.server_list(
-            request,
-            search_opts={'paginate': True},
-            all_tenants=True)
+    @classmethod
+    def list_detailed(cls, request, ids=None):
+        """Lists nodes (all of them, or those with the given ``ids`` in
+        that order) together with their instance details.
 
-        instance_details = {}
-        for instance in instances:
-            id = (instance.
-                  _apiresource._info['OS-EXT-SRV-ATTR:hypervisor_hostname'])
-            instance_details[id] = instance
+        Uses one baremetal listing and one walk over the server listing for
+        all nodes, joined on the instances' hypervisor hostname.
+        """
+        if ids is not None and not ids:
+            return []
+        nodes = _list_nodes(request)
+        if ids is not None:
+            nodes_by_id = dict((str(n.id), n) for n in nodes)
+            nodes = [nodes_by_id[str(node_id)] for node_id in ids
+                     if str(node_id) in nodes_by_id]
+
+        def load(apiresource):
+            node = cls(apiresource, request)
+            node._set_instance_details(cls._instance_details(request,
+                                                             node.id))
+            return node
+        return [_memoize(request, cls._identity_key(n.id),
+                         lambda n=n: load(n)) for n in nodes]
 
-        detail = instance_details.get(node_id)
+    @classmethod
+    def _instance_details(cls, request, hypervisor_hostname):
+        """Returns the InstanceDetails of the instance on the given
+        hypervisor, or None.
+
+        Walks the server listing only as far as needed to find it, and
+        resumes from there for the next node of the request. Only the
+        details of the servers walked so far are kept.
+        """
+        walk = _memoize(request, ('Node.instances',),
+                        lambda: {'found': {},
+                                 'servers': _server_list(request)})
+        found = walk['found']
+        while hypervisor_hostname not in found and walk['servers']:
+            try:
+                server = next(walk['servers'])
+            except StopIteration:
+                walk['servers'] = None
+                break
+            except Exception:
+                # the generator is done for once it raised, the next lookup
+                # walks the listing from the start again
+                _identity_map(request).pop(('Node.instances',), None)
+                raise
+            info = server._apiresource._info
+            found[info['OS-EXT-SRV-ATTR:hypervisor_hostname']] = \
+                InstanceDetails(info.get('addresses', {}),
+                                info['OS-EXT-STS:vm_state'])
+        return found.get(hypervisor_hostname)
+
+    def _set_instance_details(self, detail):
         if detail:
-            addresses = detail._apiresource.addresses.get('ctlplane')
+            addresses = detail.addresses.get('ctlplane')
             if addresses:
-                node.ip_address_other = (", "
+                self.ip_address_other = (", "
                     .join([addr['addr'] for addr in addresses]))
 
-            node.status = detail._apiresource._info['OS-EXT-STS:vm_state']
-            node.power_management = ""
-            if node.pm_user:
-                node.power_management = node.pm_user + "/********"
+            self.status = detail.vm_state
+            self.power_management = ""
+            if self.pm_user:
+                self.power_management = self.pm_user + "/********"
         else:
-            node.status = 'unprovisioned'
-
-        return node
+            self.status = 'unprovisioned'
 
     @classmethod
     def list(cls, request):
-        return [Node(n, request) for n in
-                baremetalclient(request).list()]
+        # Nodes loaded by Node.get carry instance details the plain listing
+        # lacks, so only reuse those rather than registering new ones.
+        identity_map = _identity_map(request)
+        nodes = _list_nodes(request)
+        return [identity_map.get(cls._identity_key(n.id)) or Node(n, request)
+                for n in nodes]
 
     @classmethod
     def list_unracked(cls, request):
         try:
             return [n for n in Node.list(request) if (n.rack is None)]
-        except requests.ConnectionError:
+        except (requests.ConnectionError,
+                tuskar_exceptions.DeadlineExceeded,
+                tuskar_exceptions.CircuitOpen):
             return []
 
     @classmethod
     def create(cls, request, **kwargs):
-        node = baremetalclient(request).create(kwargs['name'],
-                                               kwargs['cpus'],
-                                               kwargs['memory_mb'],
-                                               kwargs['local_gb'],
-                                               kwargs['prov_mac_address'],
-                                               kwargs['pm_address'],
-                                               kwargs['pm_user'],
-                                               kwargs['pm_password'],
-                                               kwargs['terminal_port'])
+        with _writing(request, 'nodes'):
+            node = baremetalclient(request).create(kwargs['name'],
+                                                   kwargs['cpus'],
+                                                   kwargs['memory_mb'],
+                                                   kwargs['local_gb'],
+                                                   kwargs['prov_mac_address'],
+                                                   kwargs['pm_address'],
+                                                   kwargs['pm_user'],
+                                                   kwargs['pm_password'],
+                                                   kwargs['terminal_port'])
         return cls(node)
 
     @property
@@ -236,8 +1368,7 @@ class Node(StringIdAPIResourceWrapper):
                 return []
             resource_class = self.rack.get_resource_class
 
-            added_flavors = tuskarclient(self.request).flavors\
-                                                      .list(resource_class.id)
+            added_flavors = _list_flavors(self.request, resource_class.id)
             self._flavors = []
             if added_flavors:
                 for f in added_flavors:
@@ -256,11 +1387,11 @@ class Node(StringIdAPIResourceWrapper):
         try:
             if not hasattr(self, '_rack'):
                 # FIXME the node.rack association should be stored somewhere
-                self._rack = None
-                for rack in Rack.list(self.request):
-                    for node_obj in rack.list_nodes:
-                        if node_obj.id == self.id:
-                            self._rack = rack
+                snapshot = TopologySnapshot.loaded(self.request)
+                if snapshot:
+                    self._rack = snapshot.rack_by_node.get(self.id)
+                else:
+                    self._rack = Rack.by_node_id(self.request).get(self.id)
 
             return self._rack
         except Exception:
@@ -292,7 +1423,7 @@ class Node(StringIdAPIResourceWrapper):
     @property
     def mac_address(self):
         try:
-            return self._apiresource.interfaces[0]['address']
+            return self.interfaces[0]['address']
         except Exception:
             return None
 
@@ -300,18 +1431,22 @@ class Node(StringIdAPIResourceWrapper):
     def running_virtual_machines(self):
         if not hasattr(self, '_running_virtual_machines'):
             if OVERCLOUD_CREDS:
-                search_opts = {}
-                search_opts['all_tenants'] = True
-                self._running_virtual_machines = [s for s in
-                    overcloudclient(self.request).servers
-                        .list(True, search_opts)
-                    if s.hostId == self.id]
+                self._running_virtual_machines = list(
+                    _overcloud_servers_by_host(self.request).get(self.id, []))
             else:
                 LOG.debug('OVERCLOUD_CREDS is not set. '
                           'Can\'t connect to Overcloud')
                 self._running_virtual_machines = []
         return self._running_virtual_machines
 
+    @property
+    def running_virtual_machines_count(self):
+        if not OVERCLOUD_CREDS:
+            LOG.debug('OVERCLOUD_CREDS is not set. '
+                      'Can\'t connect to Overcloud')
+            return 0
+        return _overcloud_vm_counts(self.request).get(self.id, 0)
+
 
 class Rack(StringIdAPIResourceWrapper):
     """Wrapper for the Rack object  returned by the
@@ -324,15 +1459,37 @@ class Rack(StringIdAPIResourceWrapper):
     def create(cls, request, **kwargs):
         nodes = kwargs.get('nodes', [])
         ## FIXME: set nodes here
-        rack = tuskarclient(request).racks.create(
-                name=kwargs['name'],
-                location=kwargs['location'],
-                subnet=kwargs['subnet'],
-                nodes=nodes,
-                resource_class={'id': kwargs['resource_class_id']},
-                slots=0)
+        with _writing(request, 'racks', 'resource_classes'):
+            rack = tuskarclient(request).racks.create(
+                    name=kwargs['name'],
+                    location=kwargs['location'],
+                    subnet=kwargs['subnet'],
+                    nodes=nodes,
+                    resource_class={'id': kwargs['resource_class_id']},
+                    slots=0)
         return cls(rack)
 
+    @classmethod
+    def create_many(cls, request, racks_kwargs, callback=None):
+        """Creates a rack for each of ``racks_kwargs`` (the arguments of
+        Rack.create), concurrently.
+
+        ``callback(index, rack, error)`` is called as each of them is done.
+        Returns ``(racks, errors)`` as _fan_out does.
+        """
+        def create(item):
+            index, kwargs = item
+            try:
+                rack = cls.create(request, **kwargs)
+            except Exception as e:
+                if callback:
+                    callback(index, None, e)
+                raise
+            if callback:
+                callback(index, rack, None)
+            return rack
+        return _fan_out(create, list(enumerate(racks_kwargs)))
+
     @classmethod
     def update(cls, request, rack_id, rack_kwargs):
         ## FIXME: set nodes here
@@ -344,28 +1501,43 @@ class Rack(StringIdAPIResourceWrapper):
             rack_args['resource_class'] = {
                 'id': rack_args.pop('resource_class_id', None)}
 
-        rack = tuskarclient(request).racks.update(rack_id, **rack_args)
+        with _writing(request, 'racks', 'resource_classes'):
+            rack = tuskarclient(request).racks.update(rack_id, **rack_args)
         return cls(rack)
 
     @classmethod
     def list(cls, request, only_free_racks=False):
+        racks = _memoize(request, ('Rack.list',), lambda: [
+            cls._identity(request, r) for r in
+            _cached_list(request, 'racks',
+                         lambda: tuskarclient(request).racks.list())])
         if only_free_racks:
-            return [Rack(r, request) for r in
-                    tuskarclient(request).racks.list() if (
-                        r.resource_class is None)]
+            return [r for r in racks if r.resource_class is None]
         else:
-            return [Rack(r, request) for r in
-                    tuskarclient(request).racks.list()]
+            return list(racks)
 
     @classmethod
     def get(cls, request, rack_id):
-        rack = cls(tuskarclient(request).racks.get(rack_id))
-        rack.request = request
-        return rack
+        return _memoize(request, cls._identity_key(rack_id), lambda: cls(
+            tuskarclient(request).racks.get(rack_id), request))
 
     @classmethod
     def delete(cls, request, rack_id):
-        tuskarclient(request).racks.delete(rack_id)
+        with _writing(request, 'racks', 'resource_classes'):
+            tuskarclient(request).racks.delete(rack_id)
+
+    @classmethod
+    def by_node_id(cls, request):
+        """Index of racks by the ids of the nodes they hold, built from
+        a single rack listing.
+        """
+        def build_index():
+            index = {}
+            for rack in cls.list(request):
+                for node in rack.nodes or []:
+                    index[str(node['id'])] = rack
+            return index
+        return _memoize(request, ('Rack.by_node_id',), build_index)
 
     @property
     def node_ids(self):
@@ -377,8 +1549,11 @@ class Rack(StringIdAPIResourceWrapper):
     @property
     def list_nodes(self):
         if not hasattr(self, '_nodes'):
-            self._nodes = [Node.get(self.request, node['id']) for node in
-                           self.nodes]
+            snapshot = TopologySnapshot.loaded(self.request)
+            if snapshot:
+                self._nodes = list(snapshot.nodes_by_rack.get(self.id, []))
+            else:
+                self._nodes = Node.list_detailed(self.request, self.node_ids)
         return self._nodes
 
     @property
@@ -405,6 +1580,8 @@ class Rack(StringIdAPIResourceWrapper):
     def list_capacities(self):
         if not hasattr(self, '_capacities'):
             self._capacities = [Capacity(c) for c in self.capacities]
+            for capacity in self._capacities:
+                capacity.object_id = 'rack-%s' % self.id
         return self._capacities
 
     @property
@@ -443,8 +1620,8 @@ class Rack(StringIdAPIResourceWrapper):
 
             if not self.get_resource_class:
                 return []
-            added_flavors = tuskarclient(self.request).flavors\
-                                .list(self.get_resource_class.id)
+            added_flavors = _list_flavors(self.request,
+                                          self.get_resource_class.id)
             self._flavors = []
             if added_flavors:
                 for f in added_flavors:
@@ -482,7 +1659,8 @@ class Rack(StringIdAPIResourceWrapper):
 
     @classmethod
     def provision(cls, request, rack_id):
-        tuskarclient(request).data_centers.provision_all()
+        with _writing(request, 'racks', 'resource_classes'):
+            tuskarclient(request).data_centers.provision_all()
 
 
 class ResourceClass(StringIdAPIResourceWrapper):
@@ -493,38 +1671,42 @@ class ResourceClass(StringIdAPIResourceWrapper):
 
     @classmethod
     def get(cls, request, resource_class_id):
-        rc = cls(tuskarclient(request).resource_classes.get(resource_class_id))
-        rc.request = request
-        return rc
+        return _memoize(request, cls._identity_key(resource_class_id),
+                        lambda: cls(tuskarclient(request).resource_classes
+                                    .get(resource_class_id), request))
 
     @classmethod
     def create(self, request, **kwargs):
-        return ResourceClass(
-            tuskarclient(request).resource_classes.create(
-                name=kwargs['name'],
-                service_type=kwargs['service_type'],
-                flavors=kwargs['flavors']))
+        with _writing(request, 'resource_classes', 'racks', 'flavors'):
+            resource_class = ResourceClass(
+                tuskarclient(request).resource_classes.create(
+                    name=kwargs['name'],
+                    service_type=kwargs['service_type'],
+                    flavors=kwargs['flavors']))
+        return resource_class
 
     @classmethod
     def list(cls, request):
-        return [cls(rc, request) for rc in (
-            tuskarclient(request).resource_classes.list())]
+        return list(_memoize(request, ('ResourceClass.list',), lambda: [
+            cls._identity(request, rc) for rc in (
+                _cached_list(request, 'resource_classes',
+                             lambda: tuskarclient(request)
+                             .resource_classes.list()))]))
 
     @classmethod
     ## FIXME : kwargs here is a little dicey
     def update(cls, request, resource_class_id, **kwargs):
-        resource_class = cls(tuskarclient(request).resource_classes.update(
-                resource_class_id, **kwargs))
-
-        ## FIXME: flavors have to be updated separately, seems less than ideal
-        for flavor_id in resource_class.flavors_ids:
-            Flavor.delete(request, resource_class_id=resource_class.id,
-                                   flavor_id=flavor_id)
-        for flavor in kwargs['flavors']:
-            Flavor.create(request,
-                          resource_class_id=resource_class.id,
-                          **flavor)
+        with _writing(request, 'resource_classes', 'racks', 'flavors'):
+            resource_class = cls(tuskarclient(request).resource_classes
+                                 .update(resource_class_id, **kwargs))
+
+            ## FIXME: flavors have to be updated separately, seems less
+            ## than ideal
+            resource_class.flavor_changes = Flavor.reconcile(
+                request, resource_class.id, kwargs['flavors'])
 
+        if resource_class.flavor_changes.errors:
+            raise resource_class.flavor_changes.errors[0][1]
         return resource_class
 
     @property
@@ -533,7 +1715,8 @@ class ResourceClass(StringIdAPIResourceWrapper):
 
     @classmethod
     def delete(cls, request, resource_class_id):
-        tuskarclient(request).resource_classes.delete(resource_class_id)
+        with _writing(request, 'resource_classes', 'racks', 'flavors'):
+            tuskarclient(request).resource_classes.delete(resource_class_id)
 
     @property
     def racks_ids(self):
@@ -545,17 +1728,68 @@ class ResourceClass(StringIdAPIResourceWrapper):
     def list_racks(self):
         """ List of racks added to ResourceClass """
         if not hasattr(self, '_racks'):
-            self._racks = [Rack.get(self.request, rid) for rid in (
-                self.racks_ids)]
+            snapshot = TopologySnapshot.loaded(self.request)
+            if snapshot:
+                self._racks = [snapshot.racks_by_id[rid]
+                               for rid in self.racks_ids
+                               if rid in snapshot.racks_by_id]
+                self._racks_errors = []
+                return self._racks
+            # racks already loaded in this request are reused, the rest is
+            # fetched concurrently and registered from this thread only
+            identity_map = _identity_map(self.request)
+            racks = dict((rid, identity_map[Rack._identity_key(rid)])
+                         for rid in self.racks_ids
+                         if Rack._identity_key(rid) in identity_map)
+            missing = [rid for rid in self.racks_ids if rid not in racks]
+            loaded, self._racks_errors = _fan_out(
+                lambda rid: tuskarclient(self.request).racks.get(rid),
+                missing)
+            for rid, rack in zip(missing, loaded):
+                if rack is not None:
+                    racks[rid] = Rack._identity(self.request, rack)
+            if self._racks_errors and not racks:
+                # none could be loaded, there's no partial list to show
+                raise self._racks_errors[0][1]
+            self._racks = [racks[rid] for rid in self.racks_ids
+                           if rid in racks]
         return self._racks
 
+    @property
+    def racks_errors(self):
+        """``(rack_id, exception)`` for the racks list_racks couldn't load,
+        for the views to tell the user the list is incomplete.
+        """
+        self.list_racks
+        return getattr(self, '_racks_errors', [])
+
     def set_racks(self, request, racks_ids):
-        # FIXME: there is a bug now in tuskar, we have to remove all racks at
-        # first and then add new ones:
+        """Makes ``racks_ids`` the racks of the class.
+
+        Only the racks joining or leaving the class are updated, through
+        their own resource_class, concurrently; nothing is sent when the
+        membership is unchanged.
+        """
+        # the racks are updated one by one rather than through the class,
+        # whose rack list update hits a bug in tuskar:
         # https://github.com/tuskar/tuskar/issues/37
-        tuskarclient(request).resource_classes.update(self.id, racks=[])
-        racks = [{'id': rid} for rid in racks_ids]
-        tuskarclient(request).resource_classes.update(self.id, racks=racks)
+        current = set(self.racks_ids)
+        wanted = set(unicode(rid) for rid in racks_ids)
+        changes = [(rid, {'id': self.id}) for rid in sorted(wanted - current)]
+        changes.extend((rid, None) for rid in sorted(current - wanted))
+        if not changes:
+            return
+
+        def update_rack(change):
+            rack_id, resource_class = change
+            return tuskarclient(request).racks.update(
+                rack_id, resource_class=resource_class)
+        results, errors = _fan_out(update_rack, changes)
+        self.racks = [{'id': rid} for rid in sorted(wanted)]
+        self.__dict__.pop('_racks', None)
+        _invalidate(request, 'resource_classes', 'racks', 'flavors')
+        if errors:
+            raise errors[0][1]
 
     @property
     def racks_count(self):
@@ -576,13 +1810,28 @@ class ResourceClass(StringIdAPIResourceWrapper):
     @property
     def nodes(self):
         if not hasattr(self, '_nodes'):
-            nodes_lists = [rack.list_nodes for rack in self.list_racks]
-            self._nodes = [node for nodes in nodes_lists for node in nodes]
+            snapshot = TopologySnapshot.loaded(self.request)
+            if snapshot:
+                self._nodes = [node for rack in self.list_racks
+                               for node in snapshot.nodes_by_rack.get(
+                                   rack.id, [])]
+            else:
+                self._nodes = Node.list_detailed(
+                    self.request,
+                    [node_id for rack in self.list_racks
+                     for node_id in rack.node_ids])
         return self._nodes
 
     @property
     def nodes_count(self):
-        return len(self.nodes)
+        """Number of nodes in the racks of the class, counted from the
+        node ids of the rack listing rather than loading the nodes.
+        """
+        if hasattr(self, '_nodes'):
+            return len(self._nodes)
+        racks_ids = set(self.racks_ids)
+        return sum([len(rack.nodes or []) for rack in Rack.list(self.request)
+                    if rack.id in racks_ids])
 
     @property
     def flavors_ids(self):
@@ -595,7 +1844,7 @@ class ResourceClass(StringIdAPIResourceWrapper):
             # FIXME just a mock of used instances, add real values
             used_instances = 0
 
-            added_flavors = tuskarclient(self.request).flavors.list(self.id)
+            added_flavors = _list_flavors(self.request, self.id)
             self._flavors = []
             for f in added_flavors:
                 flavor_obj = Flavor(f, self.request)
@@ -626,14 +1875,10 @@ class ResourceClass(StringIdAPIResourceWrapper):
         """Aggregates Rack capacities values
         """
         if not hasattr(self, '_capacities'):
-            capacities = [rack.list_capacities for rack in self.list_racks]
-
-            def add_capacities(c1, c2):
-                return [Capacity({'name': a.name,
-                                 'value': int(a.value) + int(b.value),
-                                 'unit': a.unit}) for a, b in zip(c1, c2)]
-
-            self._capacities = reduce(add_capacities, capacities)
+            self._capacities = _aggregate_capacities(
+                [rack.list_capacities for rack in self.list_racks])
+            for capacity in self._capacities:
+                capacity.object_id = 'resource_class-%s' % self.id
         return self._capacities
 
     @property
@@ -665,31 +1910,121 @@ class ResourceClass(StringIdAPIResourceWrapper):
         return any([rack.is_provisioned for rack in self.list_racks])
 
 
+# What Flavor.reconcile did, by flavor name.
+FlavorChanges = collections.namedtuple('FlavorChanges', ['created', 'updated',
+                                                         'deleted',
+                                                         'unchanged',
+                                                         'errors'])
+
+
+def _flavor_state(flavor):
+    """What Flavor.reconcile compares of an existing or submitted flavor."""
+    return (flavor.get('name'),
+            flavor.get('max_vms'),
+            sorted((c['name'], str(c['value']), c['unit'])
+                   for c in flavor.get('capacities') or []))
+
+
 class Flavor(StringIdAPIResourceWrapper):
     """Wrapper for the Flavor object returned by Tuskar.
     """
-    _attrs = ['id', 'name', 'max_vms']
+    _attrs = ['id', 'name', 'max_vms', 'capacities']
 
     @classmethod
     def get(cls, request, resource_class_id, flavor_id):
-        flavor = cls(tuskarclient(request).flavors.get(resource_class_id,
-                                                       flavor_id))
-        flavor.request = request
-        return flavor
+        key = cls._identity_key(flavor_id) + (str(resource_class_id),)
+        return _memoize(request, key, lambda: cls(
+            tuskarclient(request).flavors.get(resource_class_id, flavor_id),
+            request))
 
     @classmethod
     def create(cls, request, **kwargs):
-        return cls(tuskarclient(request).flavors.create(
-                kwargs['resource_class_id'],
-                name=kwargs['name'],
-                max_vms=kwargs['max_vms'],
-                capacities=kwargs['capacities']))
+        with _writing(request, 'flavors'):
+            flavor = cls(tuskarclient(request).flavors.create(
+                    kwargs['resource_class_id'],
+                    name=kwargs['name'],
+                    max_vms=kwargs['max_vms'],
+                    capacities=kwargs['capacities']))
+        return flavor
 
     @classmethod
     def delete(cls, request, **kwargs):
-        tuskarclient(request).flavors.delete(
-                                kwargs['resource_class_id'],
-                                kwargs['flavor_id'])
+        with _writing(request, 'flavors'):
+            tuskarclient(request).flavors.delete(
+                                    kwargs['resource_class_id'],
+                                    kwargs['flavor_id'])
+
+    @classmethod
+    def update(cls, request, **kwargs):
+        with _writing(request, 'flavors'):
+            flavor = cls(tuskarclient(request).flavors.update(
+                    kwargs['resource_class_id'],
+                    kwargs['flavor_id'],
+                    name=kwargs['name'],
+                    max_vms=kwargs['max_vms'],
+                    capacities=kwargs['capacities']))
+        return flavor
+
+    @classmethod
+    def reconcile(cls, request, resource_class_id, flavors):
+        """Makes ``flavors`` (dicts as passed to Flavor.create, optionally
+        with an ``id``) the flavors of the resource class.
+
+        Submitted flavors are matched to the existing ones by id, or else by
+        name. Only the differences are sent to Tuskar, concurrently, and
+        unchanged flavors keep their ids. Returns a FlavorChanges summary
+        listing the affected flavor names and the ``(action, error)`` of
+        the calls that failed.
+        """
+        existing = tuskarclient(request).flavors.list(resource_class_id)
+        by_id = dict((str(f.id), f) for f in existing)
+        by_name = dict((f.name, f) for f in existing)
+
+        plan = []
+        unchanged = []
+        matched = set()
+        for flavor in flavors:
+            current = by_id.get(str(flavor.get('id')))
+            if current is None or str(current.id) in matched:
+                current = by_name.get(flavor['name'])
+            if current is None or str(current.id) in matched:
+                plan.append(('create', flavor['name'], flavor))
+                continue
+            matched.add(str(current.id))
+            if _flavor_state(vars(current)) == _flavor_state(flavor):
+                unchanged.append(flavor['name'])
+            else:
+                plan.append(('update', flavor['name'],
+                             dict(flavor, flavor_id=current.id)))
+        plan.extend(('delete', f.name, {'flavor_id': f.id}) for f in existing
+                    if str(f.id) not in matched)
+
+        def run(action):
+            method, name, flavor = action
+            kwargs = dict((k, v) for k, v in flavor.items() if k != 'id')
+            manager = tuskarclient(request).flavors
+            if method == 'create':
+                manager.create(resource_class_id, **kwargs)
+            elif method == 'update':
+                manager.update(resource_class_id, kwargs.pop('flavor_id'),
+                               **kwargs)
+            else:
+                manager.delete(resource_class_id, kwargs['flavor_id'])
+            return True
+        results, errors = _fan_out(run, plan)
+        if plan:
+            _invalidate(request, 'flavors')
+
+        done = {'create': [], 'update': [], 'delete': []}
+        for (method, name, flavor), succeeded in zip(plan, results):
+            if succeeded:
+                done[method].append(name)
+        return FlavorChanges(created=done['create'],
+                             updated=done['update'],
+                             deleted=done['delete'],
+                             unchanged=unchanged,
+                             errors=[((method, name), error) for
+                                     (method, name, flavor), error in errors])
 
     @property
     def capacities(self):
@@ -701,7 +2036,7 @@ class Flavor(StringIdAPIResourceWrapper):
             self._capacities = [Capacity(CapacityStruct(
                         name=c['name'],
                         value=c['value'],
-                        unit=c['unit'])) for c in self._apiresource.capacities]
+                        unit=c['unit'])) for c in self._raw_capacities]
         return self._capacities
 
     def capacity(self, capacity_name):
@@ -745,15 +2080,120 @@ class Flavor(StringIdAPIResourceWrapper):
         # FIXME: arbitrary number
         return random.randint(0, int(self.cpu.value))
 
-    # defines a random average of capacity - API should probably be able to
-    # determine average of capacity based on capacity value and obejct_id
-    def vms_over_time(self, start_time, end_time):
-        values = []
-        current_time = start_time
-        while current_time <= end_time:
-            values.append(
-                {'date': current_time,
-                 'value': random.randint(0, self.running_virtual_machines)})
-            current_time += datetime.timedelta(hours=1)
-
-        return values
+    def vms_over_time(self, start, end, points=100):
+        """Number of VMs of the flavor from ``start`` to ``end`` (UNIX
+        timestamps), at the coarsest resolution of the time series store
+        still giving ``points`` values over that range.
+
+        Returns ``(timestamps, values)``: the UNIX timestamps of the values
+        and the values, 0 where none were recorded.
+        """
+        timestamps, values = timeseries.between(
+            'flavor-%s' % self.id, 'vms', start, end,
+            timeseries.resolution(start, end, points))
+        return timestamps, [_number(value or 0) for value in values]
+
+
+class TopologySnapshot(object):
+    """The whole inventory (resource classes, racks, nodes and flavors) of
+    a request, loaded with a fixed number of bulk calls and indexed by id,
+    by parent and by state.
+
+    Loading it registers every object in the identity map of the request,
+    so the wrappers' ``get`` and relations (a rack's nodes and resource
+    class, a node's rack, a class' racks and flavors) resolve from it
+    instead of calling the API object by object.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        # independent listings, loaded concurrently; the nodes take one
+        # baremetal listing and one walk over the server listing
+        loaders = [lambda: ResourceClass.list(request),
+                   lambda: Rack.list(request),
+                   lambda: Node.list_detailed(request)]
+        if OVERCLOUD_CREDS:
+            loaders.append(lambda: _overcloud_vm_counts(request))
+        self.resource_classes, self.racks, self.nodes = _gather(
+            *loaders)[:3]
+
+        self.resource_classes_by_id = dict((rc.id, rc) for rc in
+                                           self.resource_classes)
+        self.racks_by_id = dict((rack.id, rack) for rack in self.racks)
+        self.nodes_by_id = dict((node.id, node) for node in self.nodes)
+
+        self.racks_by_resource_class = collections.defaultdict(list)
+        self.racks_by_state = collections.defaultdict(list)
+        self.rack_by_node = {}
+        self.nodes_by_rack = collections.defaultdict(list)
+        for rack in self.racks:
+            rclass_id = rack.resource_class_id
+            if rclass_id is not None:
+                rclass_id = str(rclass_id)
+            self.racks_by_resource_class[rclass_id].append(rack)
+            self.racks_by_state[rack.state].append(rack)
+            for node_id in rack.node_ids:
+                node = self.nodes_by_id.get(str(node_id))
+                if node is not None:
+                    self.rack_by_node[node.id] = rack
+                    self.nodes_by_rack[rack.id].append(node)
+        self.nodes_by_state = collections.defaultdict(list)
+        for node in self.nodes:
+            self.nodes_by_state[node.status].append(node)
+
+        # the flavors of every class, fetched concurrently and registered
+        # from this thread only
+        def list_flavors(rc_id):
+            return _cached_list(
+                request, 'flavors',
+                lambda rc_id: tuskarclient(request).flavors.list(rc_id),
+                rc_id)
+        identity_map = _identity_map(request)
+        rclass_ids = [rc.id for rc in self.resource_classes]
+        # (resource_class_id, exception) for the flavor listings that
+        # failed, for the views to report; they're loaded again on demand
+        flavor_lists, self.errors = _fan_out(list_flavors, rclass_ids)
+        self.flavors_by_resource_class = {}
+        for rc_id, flavors in zip(rclass_ids, flavor_lists):
+            if flavors is None:
+                continue
+            identity_map[('Flavor.list', rc_id)] = flavors
+            self.flavors_by_resource_class[rc_id] = []
+            for f in flavors:
+                flavor = Flavor(f, request)
+                flavor.resource_class_id = rc_id
+                identity_map[Flavor._identity_key(flavor.id) +
+                             (rc_id,)] = flavor
+                self.flavors_by_resource_class[rc_id].append(flavor)
+
+    @classmethod
+    def get(cls, request):
+        """Returns the snapshot of ``request``, loading it if need be."""
+        return _memoize(request, ('TopologySnapshot',), lambda: cls(request))
+
+    @classmethod
+    def load(cls, request):
+        """Loads the snapshot of ``request`` for the wrappers to use, unless
+        the API fails, in which case they keep loading their relations one
+        by one. Returns the snapshot or None.
+        """
+        try:
+            return cls.get(request)
+        except Exception:
+            LOG.exception("Exception in loading the topology snapshot.")
+            _memoize(request, ('TopologySnapshot',), lambda: None)
+            return None
+
+    @classmethod
+    def loaded(cls, request):
+        """Returns the snapshot of ``request`` if it was loaded, or None."""
+        return _identity_map(request).get(('TopologySnapshot',))
+
+    @property
+    def free_racks(self):
+        return self.racks_by_resource_class.get(None, [])
+
+    @property
+    def unracked_nodes(self):
+        return [node for node in self.nodes
+                if node.id not in self.rack_by_node]
@@ -15,6 +15,17 @@
 from openstack_dashboard import exceptions
 import tuskarclient.exc as tuskarclient
 
+
+class DeadlineExceeded(Exception):
+    """A backend call didn't answer in time."""
+
+
+class CircuitOpen(Exception):
+    """A backend endpoint is down, its calls aren't even tried."""
+
+
 NOT_FOUND = exceptions.NOT_FOUND
-RECOVERABLE = exceptions.RECOVERABLE + (tuskarclient.ClientException,)
+RECOVERABLE = exceptions.RECOVERABLE + (tuskarclient.ClientException,
+                                        DeadlineExceeded,
+                                        CircuitOpen)
 UNAUTHORIZED = exceptions.UNAUTHORIZED
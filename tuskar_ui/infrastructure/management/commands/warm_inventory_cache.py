@@ -0,0 +1,99 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import optparse
+import random
+import time
+
+from django.core.management import base
+
+from tuskar_ui import api as tuskar
+
+
+LOG = logging.getLogger(__name__)
+
+
+def default_interval():
+    """Half the shortest cache TTL, so entries are refreshed before they
+    expire. None when caching is disabled.
+    """
+    ttls = [tuskar._cache_ttl(endpoint)
+            for endpoint in tuskar.DEFAULT_CACHE_TTLS]
+    ttls = [ttl for ttl in ttls if ttl]
+    if not ttls:
+        return None
+    return min(ttls) / 2.0
+
+
+def next_delay(interval, failures, jitter, max_backoff):
+    """Seconds to wait before the next refresh: ``interval`` doubled for
+    each failure in a row (up to ``max_backoff``), randomly moved by up to
+    ``jitter`` of it so that several warmers don't call the API together.
+    """
+    delay = interval
+    if failures:
+        delay = min(interval * 2 ** failures, max(max_backoff, interval))
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+class Command(base.BaseCommand):
+    help = ("Reloads the resource management inventory (racks, resource "
+            "classes, flavors, overcloud VM counts and, with remote "
+            "baremetal credentials, nodes) into the shared cache, once or, "
+            "with --daemon, on a schedule.")
+    option_list = base.BaseCommand.option_list + (
+        optparse.make_option('--daemon', action='store_true', default=False,
+                             help="Keep refreshing until interrupted."),
+        optparse.make_option('--interval', type='float', default=None,
+                             help="Seconds between two refreshes, half the "
+                                  "shortest cache TTL by default."),
+        optparse.make_option('--jitter', type='float', default=0.1,
+                             help="Fraction of the interval refreshes are "
+                                  "randomly moved by (default: 0.1)."),
+        optparse.make_option('--max-backoff', type='float', default=600,
+                             help="Most seconds to wait after failed "
+                                  "refreshes (default: 600)."),
+    )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or default_interval()
+        if not interval:
+            raise base.CommandError("Caching is disabled by the "
+                                    "TUSKAR_CACHE_TTLS setting.")
+        if not options['daemon']:
+            try:
+                self.warm()
+            except Exception as e:
+                raise base.CommandError("Unable to warm the cache: %s" % e)
+            return
+
+        failures = 0
+        while True:
+            try:
+                self.warm()
+                failures = 0
+            except Exception:
+                failures += 1
+                LOG.exception("Exception in warming the cache.")
+            time.sleep(next_delay(interval, failures, options['jitter'],
+                                  options['max_backoff']))
+
+    def warm(self):
+        started = time.time()
+        loaded = tuskar.warm_cache()
+        LOG.info("Cache warmed in %.1fs: %s", time.time() - started,
+                 ", ".join("%s %s" % (count, endpoint) for endpoint, count
+                           in sorted(loaded.items())))
+        return loaded
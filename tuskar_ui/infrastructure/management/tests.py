@@ -0,0 +1,63 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from django.core import management
+from django.core.management import base
+from django.test.utils import override_settings  # noqa
+
+from tuskar_ui import api as tuskar
+from tuskar_ui.infrastructure.management.commands import warm_inventory_cache
+from tuskar_ui.test import helpers as test
+
+
+class WarmInventoryCacheTests(test.TestCase):
+
+    def test_next_delay(self):
+        next_delay = warm_inventory_cache.next_delay
+        self.assertEquals(10, next_delay(10, 0, 0, 600))
+        self.assertEquals(80, next_delay(10, 3, 0, 600))
+        self.assertEquals(600, next_delay(10, 10, 0, 600))
+        for i in range(10):
+            self.assertTrue(9 <= next_delay(10, 0, 0.1, 600) <= 11)
+
+    @override_settings(TUSKAR_CACHE_TTLS={'racks': 30})
+    def test_warm(self):
+        self.mox.StubOutWithMock(tuskar, 'warm_cache')
+        tuskar.warm_cache().AndReturn({'racks': 3})
+        self.mox.ReplayAll()
+
+        management.call_command('warm_inventory_cache')
+
+    def test_warm_caching_disabled(self):
+        self.assertRaises(base.CommandError, management.call_command,
+                          'warm_inventory_cache')
+
+    @override_settings(TUSKAR_CACHE_TTLS={'racks': 30})
+    def test_warm_daemon(self):
+        self.mox.StubOutWithMock(tuskar, 'warm_cache')
+        self.mox.StubOutWithMock(time, 'sleep')
+        # backs off while the API fails, back to the interval after that
+        tuskar.warm_cache().AndRaise(self.exceptions.tuskar)
+        time.sleep(20)
+        tuskar.warm_cache().AndRaise(self.exceptions.tuskar)
+        time.sleep(40)
+        tuskar.warm_cache().AndReturn({'racks': 3})
+        time.sleep(10).AndRaise(KeyboardInterrupt)
+        self.mox.ReplayAll()
+
+        self.assertRaises(KeyboardInterrupt, management.call_command,
+                          'warm_inventory_cache', daemon=True, interval=10,
+                          jitter=0, max_backoff=600)
@@ -14,6 +14,7 @@
 
 from django.core import urlresolvers
 from django import http
+from django.utils import simplejson
 import mox
 
 from tuskar_ui import api as tuskar
@@ -66,3 +67,32 @@ class FlavorsTests(test.BaseAdminViewTests):
         self.assertRedirectsNoFollow(res,
             urlresolvers.reverse('horizon:infrastructure:resource_management:'
                                         'index'))
+
+    @test.create_stubs({tuskar.Flavor: ('get', 'vms_over_time')})
+    def test_vms_over_time(self):
+        flavor = self.tuskar_flavors.first()
+        resource_class = self.tuskar_resource_classes.first()
+
+        tuskar.Flavor.get(mox.IsA(http.HttpRequest),
+                          resource_class.id,
+                          flavor.id).AndReturn(flavor)
+        tuskar.Flavor.vms_over_time(0, 7200, 2).AndReturn(
+            ([0, 3600, 7200], [1, 0, 2]))
+
+        self.mox.ReplayAll()
+
+        url = urlresolvers.reverse('horizon:infrastructure:'
+                                        'resource_management:resource_classes:'
+                                        'flavors:vms_over_time',
+                                   args=[resource_class.id, flavor.id])
+        res = self.client.get(url, {'start': 0, 'end': 7200, 'points': 2})
+        self.assertEquals(res['Content-Type'], 'application/json')
+        self.assertEquals({'timestamps': [0, 3600, 7200],
+                           'values': [1, 0, 2]},
+                          simplejson.loads(res.content))
+
+        for params in ({'points': 'many'}, {'points': 0},
+                       {'start': 'nan'}, {'end': 'inf'},
+                       {'start': 7200, 'end': 0}):
+            res = self.client.get(url, params)
+            self.assertEquals(400, res.status_code)
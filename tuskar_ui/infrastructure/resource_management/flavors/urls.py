@@ -24,5 +24,8 @@ VIEW_MOD = 'tuskar_ui.infrastructure.' \
 urlpatterns = defaults.patterns(VIEW_MOD,
     defaults.url(r'^(?P<flavor_id>[^/]+)/$',
                  views.DetailView.as_view(),
-                 name='detail')
+                 name='detail'),
+    defaults.url(r'^(?P<flavor_id>[^/]+)/vms_over_time$',
+                 views.vms_over_time,
+                 name='vms_over_time')
 )
@@ -13,7 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+import math
+import time
+
 from django.core import urlresolvers
+from django import http
 from django.utils.translation import ugettext_lazy as _  # noqa
 
 from horizon import exceptions
@@ -21,6 +26,10 @@ from horizon import tabs as horizon_tabs
 
 from tuskar_ui import api as tuskar
 from tuskar_ui.infrastructure.resource_management.flavors import tabs
+from tuskar_ui import timeseries
+
+# most points charted by vms_over_time
+MAX_VMS_OVER_TIME_POINTS = 1000
 
 
 class DetailView(horizon_tabs.TabView):
@@ -74,3 +83,34 @@ class DetailView(horizon_tabs.TabView):
                                     flavor=flavor,
                                     resource_class=resource_class,
                                     **kwargs)
+
+
+def vms_over_time(request, resource_class_id=None, flavor_id=None):
+    """Number of VMs of the flavor over time, as JSON arrays of timestamps
+    and values.
+
+    Takes the ``start`` and ``end`` UNIX timestamps of the range (the last
+    week by default) and the number of ``points`` the chart has room for.
+    """
+    now = time.time()
+    try:
+        end = float(request.GET.get('end', now))
+        start = float(request.GET.get('start', end - timeseries.WEEK))
+        points = int(request.GET.get('points', 100))
+        for timestamp in (start, end):
+            if math.isnan(timestamp) or math.isinf(timestamp):
+                raise ValueError('Invalid timestamp %r' % timestamp)
+        if not 0 <= start <= end or points < 1:
+            raise ValueError('Invalid range')
+    except ValueError:
+        return http.HttpResponseBadRequest()
+    # nothing is recorded in the future
+    end = min(end, now)
+    start = min(start, end)
+    points = min(points, MAX_VMS_OVER_TIME_POINTS)
+
+    flavor = tuskar.Flavor.get(request, resource_class_id, flavor_id)
+    timestamps, values = flavor.vms_over_time(start, end, points)
+    return http.HttpResponse(json.dumps({'timestamps': timestamps,
+                                         'values': values}),
+                             mimetype='application/json')
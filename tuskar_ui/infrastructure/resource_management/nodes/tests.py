@@ -40,7 +40,8 @@ class ResourceViewTests(test.BaseAdminViewTests):
         unracked_nodes_table = res.context['unracked_nodes_table'].data
         self.assertItemsEqual(unracked_nodes_table, unracked_nodes)
 
-    @test.create_stubs({tuskar.Node: ('get', 'running_virtual_machines')})
+    @test.create_stubs({tuskar.Node: ('get',
+                                      'running_virtual_machines_count')})
     def test_detail_node(self):
         node = self.baremetal_nodes.first()
 
@@ -49,7 +50,7 @@ class ResourceViewTests(test.BaseAdminViewTests):
 
         self.mox.ReplayAll()
 
-        tuskar.Node.running_virtual_machines = []
+        tuskar.Node.running_virtual_machines_count = 0
 
         url = urlresolvers.reverse('horizon:infrastructure:'
                                    'resource_management:nodes:'
@@ -20,43 +20,78 @@ from horizon import forms
 from horizon import messages
 
 from tuskar_ui import api as tuskar
+from tuskar_ui.infrastructure.resource_management.racks import imports
+from tuskar_ui.infrastructure.resource_management.racks import staging
 
-import base64
 import csv
 import logging
+import netaddr
 import StringIO
 
 LOG = logging.getLogger(__name__)
 
+# most row errors reported for an uploaded CSV file
+MAX_ROW_ERRORS = 20
+
 
 class UploadRack(forms.SelfHandlingForm):
     csv_file = forms.FileField(label=_("Choose CSV File"),
                                help_text=("CSV file with rack definitions"),
                                required=False)
+    # token of the staged upload, see staging.py
     uploaded_data = forms.CharField(widget=forms.HiddenInput(),
                                     required=False)
 
     def clean_csv_file(self):
         csv_file = self.cleaned_data['csv_file']
-        data = csv_file.read() if csv_file else None
+        token = None
 
         if 'upload' in self.request.POST:
             if not csv_file:
                 raise django.forms.ValidationError(_('CSV file not set.'))
             else:
+                token = staging.store_upload(csv_file)
+                errors = []
+                self.more_errors = 0
                 try:
-                    CSVRack.from_str(data)
+                    existing_racks = tuskar.Rack.list(self.request)
+                    with staging.open_upload(token) as staged:
+                        staging.save(token, self._parse(staged,
+                                                        existing_racks,
+                                                        errors))
                 except Exception:
                     LOG.exception("Failed to parse rack CSV file.")
+                    staging.discard(token)
                     raise django.forms.ValidationError(
                                                 _('Failed to parse CSV file.'))
-        return data
+                if errors:
+                    staging.discard(token)
+                    if self.more_errors:
+                        errors.append(_('%d more errors.') % self.more_errors)
+                    raise django.forms.ValidationError(errors)
+        return token
+
+    def _parse(self, csv_file, existing_racks, errors):
+        # yields the records of the valid rows, and collects the first
+        # MAX_ROW_ERRORS errors of the others, only counting the rest
+        for line, rack, row_errors in CSVRack.parse(csv_file, existing_racks):
+            for error in row_errors:
+                if len(errors) >= MAX_ROW_ERRORS:
+                    self.more_errors += 1
+                    continue
+                errors.append(_('Line %(line)d: %(error)s') % {'line': line,
+                                                              'error': error})
+            if rack is not None:
+                yield vars(rack)
 
     def clean_uploaded_data(self):
         data = self.cleaned_data['uploaded_data']
         if 'add_racks' in self.request.POST:
             if not data:
                 raise django.forms.ValidationError(_('Upload CSV file first'))
+            if not staging.exists(data):
+                raise django.forms.ValidationError(
+                    _('The uploaded CSV file has expired, upload it again.'))
         elif 'upload' in self.request.POST:
             # reset obsolete uploaded data
             self.data['uploaded_data'] = None
@@ -66,41 +101,28 @@ class UploadRack(forms.SelfHandlingForm):
         if 'upload' in self.request.POST:
             # if upload button was pressed, stay on the same page
             # but show content of the CSV file in table
-            racks_str = self.cleaned_data['csv_file']
-            self.initial['racks'] = CSVRack.from_str(racks_str)
-            self.data['uploaded_data'] = base64.b64encode(racks_str)
+            token = self.cleaned_data['csv_file']
+            self.initial['racks'] = CSVRack.from_staging(token)
+            self.data['uploaded_data'] = token
             return False
         else:
-            fails = []
-            successes = []
-            racks_str = self.cleaned_data['uploaded_data']
-            racks = CSVRack.from_str(base64.b64decode(racks_str))
-            # get the resource class ids by resource class names
-            rclass_ids = dict((rc.name, rc.id) for rc in
-                    tuskar.ResourceClass.list(request))
-            for rack in racks:
-                try:
-                    tuskar.Rack.create(request, name=rack.name,
-                                           resource_class_id=
-                                               rclass_ids[rack.resource_class],
-                                           location=rack.region,
-                                           subnet=rack.subnet)
-                    # FIXME: will have to handle nodes once proper attributes
-                    # for nodes are added
-                    successes.append(rack.name)
-                except Exception:
-                    LOG.exception("Exception in processing rack CSV file.")
-                    fails.append(rack.name)
-            if successes:
-                messages.success(request,
-                                 _('Added %d racks.') % len(successes))
-            if fails:
-                messages.error(request,
-                               _('Failed to add following racks: %s') %
-                                   (',').join(fails))
+            token = self.cleaned_data['uploaded_data']
+            racks = CSVRack.from_staging(token)
+            # the view redirects to the progress of the import
+            self.job = imports.RackImport.create(racks)
+            staging.discard(token)
+            self.job.start(request)
+            messages.success(request, _('Importing %d racks.') % len(racks))
             return True
 
 
+def _network(subnet):
+    try:
+        return str(netaddr.IPNetwork(subnet).cidr)
+    except (netaddr.AddrFormatError, TypeError, ValueError):
+        return None
+
+
 class CSVRack:
     def __init__(self, **kwargs):
         self.id = kwargs['id']
@@ -112,19 +134,88 @@ class CSVRack:
 
     @classmethod
     def from_str(cls, csv_str):
+        return cls.from_file(StringIO.StringIO(csv_str))
+
+    @classmethod
+    def from_file(cls, csv_file):
         racks = []
-        csvreader = csv.reader(StringIO.StringIO(csv_str), delimiter=',')
+        for line, rack, errors in cls.parse(csv_file):
+            if errors:
+                raise ValueError('Line %d: %s' % (line, errors[0]))
+            racks.append(rack)
+        return racks
+
+    @classmethod
+    def parse(cls, csv_file, existing_racks=()):
+        """Parses ``csv_file`` row by row.
+
+        Yields ``(line_number, rack, errors)`` for every non-empty row,
+        ``rack`` being None when there are errors. Subnets and MAC
+        addresses have to be valid, and names, subnets and MAC addresses
+        can't be used twice in the file, nor names and subnets by one of
+        ``existing_racks``.
+        """
+        names = set()
+        subnets = set()
+        macs = set()
+        for rack in existing_racks:
+            names.add(rack.name)
+            subnets.add(_network(rack.subnet))
+
+        csvreader = csv.reader(csv_file, delimiter=',')
         for row in csvreader:
             # ignore empty rows
             if not row:
                 continue
-            racks.append(cls(id=row[0],
-                             name=row[0],
-                             resource_class=row[1],
-                             subnet=row[2],
-                             region=row[3],
-                             nodes=row[4].split()))
-        return racks
+            line = csvreader.line_num
+            if len(row) < 5:
+                yield line, None, [_('Expected 5 columns, found %d.') %
+                                   len(row)]
+                continue
+
+            errors = []
+            name, resource_class, subnet, region = [
+                field.strip() for field in row[:4]]
+            nodes = row[4].split()
+            if not name:
+                errors.append(_('The rack name is missing.'))
+            elif name in names:
+                errors.append(_('Rack name "%s" is already used.') % name)
+            names.add(name)
+
+            network = _network(subnet)
+            if network is None:
+                errors.append(_('Invalid subnet "%s".') % subnet)
+            elif network in subnets:
+                errors.append(_('Subnet "%s" is already used.') % subnet)
+            subnets.add(network)
+
+            for mac in nodes:
+                try:
+                    address = int(netaddr.EUI(mac))
+                except (netaddr.AddrFormatError, TypeError, ValueError):
+                    errors.append(_('Invalid MAC address "%s".') % mac)
+                    continue
+                if address in macs:
+                    errors.append(_('MAC address "%s" is already used.') %
+                                  mac)
+                macs.add(address)
+
+            if errors:
+                yield line, None, errors
+            else:
+                yield line, cls(id=name,
+                                name=name,
+                                resource_class=resource_class,
+                                subnet=subnet,
+                                region=region,
+                                nodes=nodes), []
+
+    @classmethod
+    def from_staging(cls, token):
+        """Racks parsed out of the upload staged under ``token``."""
+        return [cls(**dict((str(k), v) for k, v in record.items()))
+                for record in staging.load(token) or []]
 
     def nodes_count(self):
         return len(self.nodes)
@@ -0,0 +1,210 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import threading
+import time
+import uuid
+
+import django.conf
+import django.core.cache
+from django.core.cache.backends import locmem
+
+from tuskar_ui import api as tuskar
+
+
+LOG = logging.getLogger(__name__)
+
+# statuses of the rows of an import
+PENDING = 'pending'
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID_RESOURCE_CLASS = 'invalid resource class'
+ERROR = 'error'
+# rows tried again when an import is resumed
+RETRIED = (PENDING, ERROR)
+
+JOB_TIMEOUT = 24 * 60 * 60
+# seconds between two saves of the progress of a running import
+SAVE_INTERVAL = 1
+# A running import holds a claim in the cache, renewed every
+# HEARTBEAT_INTERVAL seconds. When its worker dies the claim expires after
+# CLAIM_TIMEOUT seconds, and the import can be resumed.
+HEARTBEAT_INTERVAL = 10
+CLAIM_TIMEOUT = 6 * HEARTBEAT_INTERVAL
+
+
+class RackImport(object):
+    """Creates the racks of an uploaded CSV file in the background.
+
+    The import is kept in the Django cache under its id, with the status of
+    every row, so any worker sharing that cache (which is only the case of
+    memcached and the like, not of the default LocMemCache, when there are
+    several processes) can report its progress or resume it.
+    """
+
+    def __init__(self, job_id, rows, finished=False):
+        self.id = job_id
+        self.rows = rows
+        self.finished = finished
+        self._lock = threading.Lock()
+        self._saved_at = 0
+
+    @staticmethod
+    def _cache_key(job_id):
+        return 'tuskar_ui.rack_import.%s' % job_id
+
+    @staticmethod
+    def _claim_key(job_id):
+        return 'tuskar_ui.rack_import.%s.claim' % job_id
+
+    @classmethod
+    def create(cls, racks):
+        """Creates an import of ``racks`` (CSVRack records)."""
+        rows = [{'name': rack.name,
+                 'resource_class': rack.resource_class,
+                 'subnet': rack.subnet,
+                 'region': rack.region,
+                 'nodes': rack.nodes,
+                 'status': PENDING,
+                 'message': ''} for rack in racks]
+        job = cls(uuid.uuid4().hex, rows)
+        job.save()
+        return job
+
+    @classmethod
+    def get(cls, job_id):
+        """Returns the import with the given id, or None."""
+        state = django.core.cache.cache.get(cls._cache_key(job_id))
+        if state is None:
+            return None
+        return cls(job_id, state['rows'], state['finished'])
+
+    def save(self):
+        self._saved_at = time.time()
+        django.core.cache.cache.set(self._cache_key(self.id),
+                                    {'rows': self.rows,
+                                     'finished': self.finished},
+                                    JOB_TIMEOUT)
+
+    @property
+    def counts(self):
+        counts = {}
+        for row in self.rows:
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+        return counts
+
+    @property
+    def running(self):
+        """Whether a worker (still alive) runs the import."""
+        claim = django.core.cache.cache.get(self._claim_key(self.id))
+        return claim is not None
+
+    @property
+    def resumable(self):
+        """Whether rows are left to do, and no worker runs the import: it
+        has finished, or the worker running it died.
+        """
+        return (not self.running and
+                any(row['status'] in RETRIED for row in self.rows))
+
+    def start(self, request):
+        """Runs the rows still to be done in a background thread, or in this
+        one when the TUSKAR_BACKGROUND_JOBS setting is off.
+
+        Returns False, without doing anything, if a worker runs it already.
+        """
+        if not django.core.cache.cache.add(self._claim_key(self.id), True,
+                                           CLAIM_TIMEOUT):
+            return False
+        if isinstance(django.core.cache.cache, locmem.LocMemCache):
+            LOG.warning("Rack imports are kept in a LocMemCache, only the "
+                        "process running them can report their progress.")
+        self.finished = False
+        self.save()
+        if getattr(django.conf.settings, 'TUSKAR_BACKGROUND_JOBS', True):
+            thread = threading.Thread(target=self.run, args=(request,))
+            thread.daemon = True
+            thread.start()
+        else:
+            self.run(request)
+        return True
+
+    def _heartbeat(self, stopped):
+        while True:
+            stopped.wait(HEARTBEAT_INTERVAL)
+            if stopped.is_set():
+                return
+            django.core.cache.cache.set(self._claim_key(self.id), True,
+                                        CLAIM_TIMEOUT)
+
+    def run(self, request):
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(stopped,))
+        heartbeat.daemon = True
+        heartbeat.start()
+        try:
+            # the import goes on after the request, out of its time budget
+            with tuskar.detached():
+                self._run(request)
+        except Exception as e:
+            LOG.exception("Exception in importing racks.")
+            for index, row in enumerate(self.rows):
+                if row['status'] == PENDING:
+                    self._set_status(index, ERROR, unicode(e))
+        finally:
+            stopped.set()
+            with self._lock:
+                self.finished = True
+                self.save()
+            django.core.cache.cache.delete(self._claim_key(self.id))
+
+    def _run(self, request):
+        rclass_ids = dict((rc.name, rc.id) for rc in
+                          tuskar.ResourceClass.list(request))
+        names = set(rack.name for rack in tuskar.Rack.list(request))
+        todo = []
+        for index, row in enumerate(self.rows):
+            if row['status'] not in RETRIED:
+                continue
+            if row['name'] in names:
+                self._set_status(index, DUPLICATE)
+            elif row['resource_class'] not in rclass_ids:
+                self._set_status(index, INVALID_RESOURCE_CLASS)
+            else:
+                names.add(row['name'])
+                todo.append(index)
+
+        def done(n, rack, error):
+            if error is None:
+                self._set_status(todo[n], CREATED)
+            else:
+                self._set_status(todo[n], ERROR, unicode(error))
+        # FIXME: will have to handle nodes once proper attributes
+        # for nodes are added
+        tuskar.Rack.create_many(
+            request,
+            [{'name': self.rows[i]['name'],
+              'resource_class_id':
+                  rclass_ids[self.rows[i]['resource_class']],
+              'location': self.rows[i]['region'],
+              'subnet': self.rows[i]['subnet']} for i in todo],
+            callback=done)
+
+    def _set_status(self, index, status, message=''):
+        with self._lock:
+            self.rows[index]['status'] = status
+            self.rows[index]['message'] = message
+            if time.time() - self._saved_at >= SAVE_INTERVAL:
+                self.save()
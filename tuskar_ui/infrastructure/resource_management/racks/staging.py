@@ -0,0 +1,110 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+
+import django.conf
+
+
+LOG = logging.getLogger(__name__)
+
+# Uploaded files and what was parsed out of them are kept here, under an
+# opaque token, between the upload and its confirmation. Has to be shared by
+# all web servers when there are several of them.
+STAGING_DIR = getattr(django.conf.settings, 'TUSKAR_UPLOAD_STAGING_DIR',
+                      os.path.join(tempfile.gettempdir(), 'tuskar_ui_uploads'))
+# seconds staged uploads are kept
+STAGING_TIMEOUT = 24 * 60 * 60
+
+TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _path(token, extension):
+    if not TOKEN_RE.match(token or ''):
+        raise ValueError('Invalid upload token %r' % token)
+    return os.path.join(STAGING_DIR, '%s.%s' % (token, extension))
+
+
+def _cleanup():
+    if not os.path.isdir(STAGING_DIR):
+        os.makedirs(STAGING_DIR, 0o700)
+    expired = time.time() - STAGING_TIMEOUT
+    for name in os.listdir(STAGING_DIR):
+        path = os.path.join(STAGING_DIR, name)
+        try:
+            if os.path.getmtime(path) < expired:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def store_upload(uploaded_file):
+    """Streams ``uploaded_file`` to the staging area, chunk by chunk, and
+    returns its token.
+    """
+    _cleanup()
+    token = uuid.uuid4().hex
+    with open(_path(token, 'upload'), 'wb') as staged:
+        for chunk in uploaded_file.chunks():
+            staged.write(chunk)
+    return token
+
+
+def open_upload(token):
+    return open(_path(token, 'upload'), 'rb')
+
+
+def save(token, records):
+    """Stages ``records`` (JSON serializable) parsed out of the upload, one
+    per line, as they come.
+    """
+    with open(_path(token, 'json'), 'w') as staged:
+        for record in records:
+            staged.write(json.dumps(record))
+            staged.write('\n')
+
+
+def exists(token):
+    """Tells whether records are staged under ``token``, without reading
+    them.
+    """
+    try:
+        return os.path.exists(_path(token, 'json'))
+    except ValueError:
+        return False
+
+
+def load(token):
+    """Returns the records staged under ``token``, or None if there are
+    none (any more).
+    """
+    try:
+        with open(_path(token, 'json')) as staged:
+            return [json.loads(line) for line in staged]
+    except (IOError, ValueError):
+        return None
+
+
+def discard(token):
+    for extension in ('upload', 'json'):
+        try:
+            os.remove(_path(token, extension))
+        except (OSError, ValueError):
+            pass
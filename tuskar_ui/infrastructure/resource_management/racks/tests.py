@@ -10,22 +10,36 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import tempfile
+import time
+
+from django.core import cache
+from django.core.files import uploadedfile
 from django.core import urlresolvers
 from django import http
+from django.test.utils import override_settings  # noqa
+from django.utils import simplejson
 
 import mox
 
 from tuskar_ui import api as tuskar
+from tuskar_ui.infrastructure.resource_management.racks import forms
+from tuskar_ui.infrastructure.resource_management.racks import imports
+from tuskar_ui.infrastructure.resource_management.racks import staging
 from tuskar_ui.test import helpers as test
-
-import base64
-import tempfile
+from tuskar_ui import timeseries
 
 
 class RackViewTests(test.BaseAdminViewTests):
     index_page = urlresolvers.reverse(
         'horizon:infrastructure:resource_management:index')
 
+    def setUp(self):
+        super(RackViewTests, self).setUp()
+        # keep the uploads of the tests out of the real staging area
+        test.stub_directory(self, staging, 'STAGING_DIR')
+
     @test.create_stubs({tuskar.ResourceClass: ('list',)})
     def test_create_rack_get(self):
         tuskar.ResourceClass.list(
@@ -230,7 +244,12 @@ class RackViewTests(test.BaseAdminViewTests):
         self.assertTemplateUsed(rack,
             'infrastructure/resource_management/racks/upload.html')
 
+    @test.create_stubs({tuskar.Rack: ('list',)})
     def test_upload_rack_upload(self):
+        tuskar.Rack.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_racks.list())
+        self.mox.ReplayAll()
         csv_data = ('Rack1,rclass1,192.168.111.0/24,regionX,f0:dd:f1:da:f9:b5 '
                    'f2:de:f1:da:f9:66 f2:de:ff:da:f9:67')
         temp_file = tempfile.TemporaryFile()
@@ -245,8 +264,60 @@ class RackViewTests(test.BaseAdminViewTests):
         self.assertTemplateUsed(resp,
             'infrastructure/resource_management/racks/upload.html')
         self.assertNoFormErrors(resp)
+        token = resp.context['form']['uploaded_data'].value()
+        self.assertEqual(['Rack1'], [rack.name for rack in
+                                     forms.CSVRack.from_staging(token)])
+        self.assertEqual(['Rack1'], [rack.name for rack in
+                                     resp.context['racks_table'].data])
+
+    @test.create_stubs({tuskar.Rack: ('list',)})
+    def test_upload_rack_upload_with_row_errors(self):
+        tuskar.Rack.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_racks.list())
+        self.mox.ReplayAll()
+        csv_data = ('Rack1,rclass1,192.168.111.0/24,regionX,'
+                    'f0:dd:f1:da:f9:b5\n'
+                    'Rack1,rclass1,192.168.1.0/24,regionX,f0:dd:f1:da:f9:b5\n'
+                    'Rack2,rclass1\n')
+        temp_file = tempfile.TemporaryFile()
+        temp_file.write(csv_data)
+        temp_file.flush()
+        temp_file.seek(0)
+
+        data = {'csv_file': temp_file, 'upload': '1'}
+        url = urlresolvers.reverse('horizon:infrastructure:'
+                                        'resource_management:racks:upload')
+        resp = self.client.post(url, data)
+        self.assertEqual(
+            ['Line 2: Rack name "Rack1" is already used.',
+             'Line 2: Subnet "192.168.1.0/24" is already used.',
+             'Line 2: MAC address "f0:dd:f1:da:f9:b5" is already used.',
+             'Line 3: Expected 5 columns, found 2.'],
+            resp.context['form'].errors['csv_file'])
         self.assertEqual(resp.context['form']['uploaded_data'].value(),
-            base64.b64encode(csv_data))
+            None)
+
+    @test.create_stubs({tuskar.Rack: ('list',)})
+    def test_upload_rack_upload_with_many_row_errors(self):
+        tuskar.Rack.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn([])
+        self.mox.ReplayAll()
+        self.mox.stubs.Set(forms, 'MAX_ROW_ERRORS', 2)
+        temp_file = tempfile.TemporaryFile()
+        temp_file.write('Rack1\n' * 5)
+        temp_file.flush()
+        temp_file.seek(0)
+
+        data = {'csv_file': temp_file, 'upload': '1'}
+        url = urlresolvers.reverse('horizon:infrastructure:'
+                                        'resource_management:racks:upload')
+        resp = self.client.post(url, data)
+        self.assertEqual(
+            ['Line 1: Expected 5 columns, found 1.',
+             'Line 2: Expected 5 columns, found 1.',
+             '3 more errors.'],
+            resp.context['form'].errors['csv_file'])
 
     def test_upload_rack_upload_with_error(self):
         data = {'upload': '1'}
@@ -259,9 +330,12 @@ class RackViewTests(test.BaseAdminViewTests):
         self.assertEqual(resp.context['form']['uploaded_data'].value(),
             None)
 
-    @test.create_stubs({tuskar.Rack: ('create',),
+    @test.create_stubs({tuskar.Rack: ('create', 'list'),
                         tuskar.ResourceClass: ('list',)})
     def test_upload_rack_create(self):
+        tuskar.Rack.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_racks.list())
         tuskar.Rack.create(mox.IsA(http.request.HttpRequest),
                 name='Rack1',
                 resource_class_id='1',
@@ -274,18 +348,144 @@ class RackViewTests(test.BaseAdminViewTests):
         csv_data = ('Rack1,rclass1,192.168.111.0/24,regionX,f0:dd:f1:da:f9:b5 '
                    'f2:de:f1:da:f9:66 f2:de:ff:da:f9:67')
 
-        data = {'uploaded_data': base64.b64encode(csv_data), 'add_racks': '1'}
+        token = staging.store_upload(
+            uploadedfile.SimpleUploadedFile('racks.csv', csv_data))
+        staging.save(token, [vars(rack) for rack in
+                             forms.CSVRack.from_str(csv_data)])
+
+        data = {'uploaded_data': token, 'add_racks': '1'}
         url = urlresolvers.reverse('horizon:infrastructure:'
                                         'resource_management:racks:upload')
         resp = self.client.post(url, data)
-        self.assertRedirectsNoFollow(resp, self.index_page)
+        # redirected to the progress of the import
+        self.assertEqual(302, resp.status_code)
+        self.assertRegexpMatches(resp['location'], r'/import/[0-9a-f]{32}/$')
         self.assertMessageCount(success=1)
         self.assertMessageCount(error=0)
+        # the staged upload is gone once imported
+        self.assertFalse(staging.exists(token))
+        self.assertIsNone(staging.load(token))
+
+    def test_upload_rack_create_expired(self):
+        data = {'uploaded_data': 'a' * 32, 'add_racks': '1'}
+        url = urlresolvers.reverse('horizon:infrastructure:'
+                                        'resource_management:racks:upload')
+        resp = self.client.post(url, data)
+        self.assertEqual(
+            ['The uploaded CSV file has expired, upload it again.'],
+            resp.context['form'].errors['uploaded_data'])
+
+    @test.create_stubs({tuskar.Rack: ('create', 'list'),
+                        tuskar.ResourceClass: ('list',)})
+    def test_import_status(self):
+        tuskar.Rack.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_racks.list())
+        tuskar.ResourceClass.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_resource_classes.list())
+        tuskar.Rack.create(mox.IsA(http.request.HttpRequest),
+                name='Rack4',
+                resource_class_id='1',
+                location='regionX',
+                subnet='192.168.114.0/24').AndRaise(self.exceptions.tuskar)
+        self.mox.ReplayAll()
+        csv_data = ('rack1,rclass1,192.168.111.0/24,regionX,\n'
+                    'Rack4,rclass1,192.168.114.0/24,regionX,\n'
+                    'Rack5,rclassX,192.168.115.0/24,regionX,\n')
+        job = imports.RackImport.create(forms.CSVRack.from_str(csv_data))
+        job.start(self.request)
+
+        url = urlresolvers.reverse('horizon:infrastructure:'
+                                   'resource_management:racks:'
+                                   'import_status', args=[job.id])
+        res = self.client.get(url)
+        status = simplejson.loads(res.content)
+        self.assertTrue(status['finished'])
+        self.assertTrue(status['resumable'])
+        self.assertEqual(['duplicate', 'error', 'invalid resource class'],
+                         [row['status'] for row in status['rows']])
+        # resuming is ImportView's job
+        self.assertEqual(405, self.client.post(url).status_code)
+
+    @test.create_stubs({tuskar.Rack: ('create', 'list'),
+                        tuskar.ResourceClass: ('list',)})
+    def test_import_resume(self):
+        tuskar.ResourceClass.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_resource_classes.list())
+        tuskar.Rack.list(
+            mox.IsA(http.request.HttpRequest)).AndReturn(
+                self.tuskar_racks.list())
+        tuskar.Rack.create(mox.IsA(http.request.HttpRequest),
+                name='Rack4',
+                resource_class_id='1',
+                location='regionX',
+                subnet='192.168.114.0/24').AndReturn(None)
+        self.mox.ReplayAll()
+        csv_data = 'Rack4,rclass1,192.168.114.0/24,regionX,\n'
+        job = imports.RackImport.create(forms.CSVRack.from_str(csv_data))
+        url = urlresolvers.reverse('horizon:infrastructure:'
+                                   'resource_management:racks:import',
+                                   args=[job.id])
 
-    @test.create_stubs({tuskar.Rack: ('get', 'list_nodes', 'list_flavors')})
+        # while a worker runs the import, it can't be resumed
+        cache.cache.add(job._claim_key(job.id), True)
+        self.assertFalse(job.resumable)
+        self.assertFalse(job.start(self.request))
+        res = self.client.get(url)
+        self.assertTemplateUsed(
+            res, 'infrastructure/resource_management/racks/import.html')
+        self.assertTrue(res.context['job'].running)
+
+        # once its claim expired, the worker is gone and it can be
+        cache.cache.delete(job._claim_key(job.id))
+        self.assertTrue(imports.RackImport.get(job.id).resumable)
+        res = self.client.post(url)
+        self.assertRedirectsNoFollow(res, url)
+        job = imports.RackImport.get(job.id)
+        self.assertTrue(job.finished)
+        self.assertFalse(job.running)
+        self.assertEqual([imports.CREATED],
+                         [row['status'] for row in job.rows])
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=10,
+                       TUSKAR_API_MAX_WORKERS=2)
+    def test_import_out_of_request_budget(self):
+        rack = self.tuskarclient_racks.first()
+        client = self.mox.CreateMockAnything()
+        client.resource_classes = self.mox.CreateMockAnything()
+        client.resource_classes.list().AndReturn(
+            self.tuskarclient_resource_classes.list())
+        client.racks = self.mox.CreateMockAnything()
+        client.racks.list().AndReturn(self.tuskarclient_racks.list())
+        for name, subnet in (('Rack4', '192.168.114.0/24'),
+                             ('Rack5', '192.168.115.0/24')):
+            client.racks.create(name=name, location='regionX',
+                                subnet=subnet, nodes=[],
+                                resource_class={'id': '1'},
+                                slots=0).InAnyOrder().AndReturn(rack)
+        self.mox.stubs.Set(tuskar, 'tuskarclient',
+                           lambda request: tuskar._budgeted(request, client))
+        self.mox.ReplayAll()
+        csv_data = ('Rack4,rclass1,192.168.114.0/24,regionX,\n'
+                    'Rack5,rclass1,192.168.115.0/24,regionX,\n')
+        job = imports.RackImport.create(forms.CSVRack.from_str(csv_data))
+
+        # the budget of the request that started the import is spent, which
+        # doesn't stop the import going on after it
+        self.request._tuskar_deadline = time.time() - 1
+        job.start(self.request)
+        self.assertEqual([imports.CREATED, imports.CREATED],
+                         [row['status'] for row in job.rows])
+
+    @test.create_stubs({tuskar.Rack: ('get', 'list_nodes', 'list_flavors'),
+                        tuskar.TopologySnapshot: ('load',)})
     def test_detail_rack(self):
         rack = self.tuskar_racks.first()
 
+        tuskar.TopologySnapshot.load(
+            mox.IsA(http.HttpRequest)).AndReturn(None)
         tuskar.Rack.get(mox.IsA(http.HttpRequest),
                         rack.id).AndReturn(rack)
 
@@ -301,14 +501,31 @@ class RackViewTests(test.BaseAdminViewTests):
         self.assertTemplateUsed(res, "infrastructure/resource_management/"
                                      "racks/detail.html")
 
-    # FIXME: test actual json output once we stop using mock data
     def test_usage_data_rack(self):
+        test.stub_timeseries_dir(self)
+        hour = 1380000000 // timeseries.HOUR * timeseries.HOUR
+        self.mox.stubs.Set(time, 'time', lambda: hour + 60)
+        timeseries.record('rack-1', 'cpu', 10)
+        timeseries.record('rack-1', 'cpu', 20)
+
         url = urlresolvers.reverse('horizon:infrastructure:'
                                    'resource_management:racks:usage_data')
-        res = self.client.get(url)
+        res = self.client.get(url, {'interval': '24h',
+                                    'series': 'cpu,ram',
+                                    'object': 'rack-1'})
         self.assertEquals(res['Content-Type'], 'application/json')
+        data = simplejson.loads(res.content)
+        self.assertEquals(24, len(data))
+        # newest first, missing points are 0
+        self.assertEquals((15, 0), (data[0]['cpu'], data[0]['ram']))
+        self.assertEquals((0, 0), (data[1]['cpu'], data[1]['ram']))
+        date = datetime.datetime.fromtimestamp(hour)
+        self.assertEquals(date.strftime('%Y-%m-%dT%H:%M:%S.000'),
+                          data[0]['date'])
+        date = datetime.datetime.fromtimestamp(hour - timeseries.HOUR)
+        self.assertEquals(date.strftime('%Y-%m-%dT%H:%M:%S.000'),
+                          data[1]['date'])
 
-    # FIXME: test actual json output once we stop using mock data
     @test.create_stubs({tuskar.Rack: ('get',)})
     def test_top_communicating_rack(self):
         rack = self.tuskar_racks.first()
@@ -324,7 +541,6 @@ class RackViewTests(test.BaseAdminViewTests):
         res = self.client.get(url)
         self.assertEquals(res['Content-Type'], 'application/json')
 
-    # FIXME: test actual json output once we stop using mock data
     @test.create_stubs({tuskar.Rack: ('get',)})
     def test_node_health_rack(self):
         rack = self.tuskar_racks.first()
@@ -23,6 +23,11 @@ VIEW_MOD = 'tuskar_ui.infrastructure.resource_management.racks.views'
 urlpatterns = urls.patterns(VIEW_MOD,
     urls.url(r'^create/$', views.CreateView.as_view(), name='create'),
     urls.url(r'^upload/$', views.UploadView.as_view(), name='upload'),
+    urls.url(r'^import/(?P<job_id>[^/]+)/$', views.ImportView.as_view(),
+             name='import'),
+    urls.url(r'^import/(?P<job_id>[^/]+)\.json$',
+             'import_status',
+             name='import_status'),
     urls.url(r'^usage_data$',
              views.UsageDataView.as_view(),
              name='usage_data'),
@@ -23,15 +23,19 @@ from django import http
 
 from django.utils import simplejson
 from django.utils.translation import ugettext_lazy as _  # noqa
+from django.views.decorators import http as http_decorators
 from django.views import generic
 
 from horizon import exceptions
 from horizon import forms as horizon_forms
+from horizon import messages
 from horizon import tabs as horizon_tabs
 from horizon import workflows as horizon_workflows
 
 from tuskar_ui import api as tuskar
+from tuskar_ui import timeseries
 from tuskar_ui.infrastructure.resource_management.racks import forms
+from tuskar_ui.infrastructure.resource_management.racks import imports
 from tuskar_ui.infrastructure.resource_management.racks import tables
 from tuskar_ui.infrastructure.resource_management.racks import tabs
 from tuskar_ui.infrastructure.resource_management.racks import workflows
@@ -59,6 +63,40 @@ class UploadView(horizon_forms.ModalFormView):
                 self.request, kwargs['form'].initial.get('racks', []))
         return context
 
+    def form_valid(self, form):
+        self.form = form
+        return super(UploadView, self).form_valid(form)
+
+    def get_success_url(self):
+        # the progress of the import the racks were added by
+        return urlresolvers.reverse(
+            'horizon:infrastructure:resource_management:racks:import',
+            args=[self.form.job.id])
+
+
+class ImportView(generic.TemplateView):
+    """Progress of a rack import, polling import_status. POST resumes it."""
+    template_name = 'infrastructure/resource_management/racks/import.html'
+
+    def get_job(self):
+        job = imports.RackImport.get(self.kwargs['job_id'])
+        if job is None:
+            raise http.Http404
+        return job
+
+    def get_context_data(self, **kwargs):
+        context = super(ImportView, self).get_context_data(**kwargs)
+        job = self.get_job()
+        context['job'] = job
+        context['counts'] = sorted(job.counts.items())
+        return context
+
+    def post(self, request, *args, **kwargs):
+        job = self.get_job()
+        if job.resumable:
+            job.start(request)
+        return http.HttpResponseRedirect(request.path)
+
 
 class EditView(horizon_workflows.WorkflowView):
     workflow_class = workflows.EditRack
@@ -116,6 +154,11 @@ class DetailView(horizon_tabs.TabView):
         if not hasattr(self, "_rack"):
             try:
                 rack_id = self.kwargs['rack_id']
+                snapshot = tuskar.TopologySnapshot.load(self.request)
+                if snapshot is not None and snapshot.errors:
+                    messages.warning(self.request,
+                                     _('Unable to retrieve the flavors of '
+                                       'some resource classes.'))
                 rack = tuskar.Rack.get(self.request, rack_id)
             except Exception:
                 redirect = urlresolvers.reverse(
@@ -134,38 +177,33 @@ class DetailView(horizon_tabs.TabView):
 
 
 class UsageDataView(generic.View):
+    # interval: (seconds per point, number of points)
+    INTERVALS = {'12h': (timeseries.HOUR, 12),
+                 '24h': (timeseries.HOUR, 24),
+                 '1w': (timeseries.DAY, 7),
+                 '1m': (timeseries.DAY, 30),
+                 '1y': (timeseries.WEEK, 52)}
+    # the format horizon.d3linechart parses, milliseconds included
+    DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.000'
 
     def get(self, request, *args, **kwargs):
         interval = request.GET.get('interval', '1w')
         series = request.GET.get('series', "")
         series = series.split(',')
+        object_id = request.GET.get('object') or 'overall'
 
-        if interval == '12h':
-            data_count = 12
-            timedelta_param = 'hours'
-        elif interval == '24h':
-            data_count = 24
-            timedelta_param = 'hours'
-        elif interval == '1m':
-            data_count = 30
-            timedelta_param = 'days'
-        elif interval == '1y':
-            data_count = 52
-            timedelta_param = 'weeks'
-        else:
-            # default is 1 week
-            data_count = 7
-            timedelta_param = 'days'
+        # default is 1 week
+        seconds, points = self.INTERVALS.get(interval, self.INTERVALS['1w'])
 
         values = []
-        for i in range(data_count):
-            timediff = datetime.timedelta(**{timedelta_param: i})
-            current_value = {'date': datetime.datetime.now() - timediff}
-
-            for usage_type in series:
-                current_value[usage_type] = random.randint(1, 9)
-
-            values.append(current_value)
+        for usage_type in series:
+            usage = timeseries.values(object_id, usage_type, seconds, points)
+            if not values:
+                for timestamp, value in usage:
+                    date = datetime.datetime.fromtimestamp(timestamp)
+                    values.append({'date': date.strftime(self.DATE_FORMAT)})
+            for current_value, (timestamp, value) in zip(values, usage):
+                current_value[usage_type] = value or 0
 
         return http.HttpResponse(
                     json.dumps(values, cls=json_serializer.DjangoJSONEncoder),
@@ -250,3 +288,21 @@ def check_state(request, rack_id=None):
 
     return http.HttpResponse(simplejson.dumps(res),
                              mimetype="application/json")
+
+
+@http_decorators.require_GET
+def import_status(request, job_id=None):
+    """Progress of a rack import, for ImportView to poll."""
+    job = imports.RackImport.get(job_id)
+    if job is None:
+        raise http.Http404
+
+    res = {'finished': job.finished,
+           'running': job.running,
+           'resumable': job.resumable,
+           'counts': job.counts,
+           'rows': [{'name': row['name'],
+                     'status': row['status'],
+                     'message': row['message']} for row in job.rows]}
+    return http.HttpResponse(simplejson.dumps(res),
+                             mimetype="application/json")
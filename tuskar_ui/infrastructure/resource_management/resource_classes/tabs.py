@@ -15,6 +15,7 @@
 from django.utils.translation import ugettext_lazy as _  # noqa
 
 from horizon import exceptions
+from horizon import messages
 from horizon import tabs
 
 from tuskar_ui.infrastructure.resource_management.resource_classes\
@@ -44,6 +45,9 @@ class RacksTab(tabs.TableTab):
         try:
             resource_class = self.tab_group.kwargs['resource_class']
             racks = resource_class.list_racks
+            if resource_class.racks_errors:
+                messages.warning(self.tab_group.request,
+                                 _('Unable to retrieve some of the racks.'))
         except Exception:
             racks = []
             exceptions.handle(self.tab_group.request,
@@ -276,13 +276,16 @@ class ResourceClassViewTests(test.BaseAdminViewTests):
                 'horizon:infrastructure:resource_management:index'))
 
     @test.create_stubs({
-        tuskar.ResourceClass: ('get', 'list_flavors', 'list_racks')
+        tuskar.ResourceClass: ('get', 'list_flavors', 'list_racks'),
+        tuskar.TopologySnapshot: ('load',)
     })
     def test_detail_get(self):
         resource_class = self.tuskar_resource_classes.first()
         flavors = []
         racks = []
 
+        tuskar.TopologySnapshot.load(
+            mox.IsA(http.HttpRequest)).AndReturn(None)
         tuskar.ResourceClass.get(
             mox.IsA(http.HttpRequest), resource_class.id).\
             AndReturn(resource_class)
@@ -304,6 +307,32 @@ class ResourceClassViewTests(test.BaseAdminViewTests):
         self.assertTemplateUsed(res,
             'infrastructure/resource_management/resource_classes/detail.html')
 
+    @test.create_stubs({
+        tuskar.ResourceClass: ('get',),
+        tuskar.TopologySnapshot: ('load',)
+    })
+    def test_detail_get_racks_errors(self):
+        resource_class = self.tuskar_resource_classes.first()
+        resource_class._flavors = []
+        resource_class._racks = []
+        resource_class._racks_errors = [('1', Exception('rack 1 is gone'))]
+
+        tuskar.TopologySnapshot.load(
+            mox.IsA(http.HttpRequest)).AndReturn(None)
+        tuskar.ResourceClass.get(
+            mox.IsA(http.HttpRequest), resource_class.id).\
+            AndReturn(resource_class)
+        self.mox.ReplayAll()
+
+        url = urlresolvers.reverse(
+            'horizon:infrastructure:resource_management:resource_classes:'
+                'detail',
+            args=[resource_class.id])
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        # the racks that failed to load aren't left out silently
+        self.assertMessageCount(res, warning=1)
+
     @test.create_stubs({
         tuskar.ResourceClass: ('get',)
     })
@@ -372,11 +401,14 @@ class ResourceClassViewTests(test.BaseAdminViewTests):
         self.assertEqual(data[0]['name'], 'rack1')
 
     @test.create_stubs({
-        tuskar.ResourceClass: ('get', 'list_flavors', 'list_racks')
+        tuskar.ResourceClass: ('get', 'list_flavors', 'list_racks'),
+        tuskar.TopologySnapshot: ('load',)
     })
     def test_detail_get_exception(self):
         resource_class = self.tuskar_resource_classes.first()
 
+        tuskar.TopologySnapshot.load(
+            mox.IsA(http.HttpRequest)).AndReturn(None)
         tuskar.ResourceClass.get(
             mox.IsA(http.HttpRequest),
             resource_class.id).\
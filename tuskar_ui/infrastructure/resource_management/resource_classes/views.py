@@ -25,6 +25,7 @@ from django.utils.translation import ugettext_lazy as _  # noqa
 
 from horizon import exceptions
 from horizon import forms as horizon_forms
+from horizon import messages
 from horizon import tabs as horizon_tabs
 from horizon import workflows as horizon_workflows
 
@@ -103,6 +104,11 @@ class DetailView(horizon_tabs.TabView):
         if not hasattr(self, "_resource_class"):
             try:
                 resource_class_id = self.kwargs['resource_class_id']
+                snapshot = tuskar.TopologySnapshot.load(self.request)
+                if snapshot is not None and snapshot.errors:
+                    messages.warning(self.request,
+                                     _('Unable to retrieve the flavors of '
+                                       'some resource classes.'))
                 resource_class = tuskar.ResourceClass.get(self.request,
                                                           resource_class_id)
             except Exception:
@@ -225,7 +225,7 @@ class ResourceClassWorkflowMixin:
             flavor_name = "%s.%s" % (resource_class_name, flavor['name'])
             # FIXME: for now just use blank max_vms
             flavors.append({'name': flavor_name, 'capacities': capacities,
-                            'max_vms': None, 'id': data.get('id')})
+                            'max_vms': None, 'id': flavor.get('id')})
         return flavors
 
     def _add_racks(self, request, data, resource_class):
@@ -30,11 +30,13 @@ class ResourceManagementTests(test.BaseAdminViewTests):
             'get',
             'list',
             'list_racks',
-            'nodes'),
+            'nodes_count'),
         tuskar.Node: (
             'list',),
         tuskar.Rack: (
-            'list',)})
+            'list',),
+        tuskar.TopologySnapshot: (
+            'load',)})
     def test_index(self):
 
         # ResourceClass stubs
@@ -43,7 +45,7 @@ class ResourceManagementTests(test.BaseAdminViewTests):
         nodes = []
         racks = []
 
-        tuskar.ResourceClass.nodes = nodes
+        tuskar.ResourceClass.nodes_count = 0
         tuskar.ResourceClass.list_racks = racks
 
         tuskar.ResourceClass.list(
@@ -62,6 +64,9 @@ class ResourceManagementTests(test.BaseAdminViewTests):
         tuskar.Node.list(mox.IsA(http.HttpRequest)).AndReturn(nodes)
         # Rack stubs end
 
+        tuskar.TopologySnapshot.load(
+            mox.IsA(http.HttpRequest)).AndReturn(None)
+
         self.mox.ReplayAll()
 
         url = urlresolvers.reverse(
@@ -17,11 +17,23 @@ Views for Resource Management.
 """
 
 
+from django.utils.translation import ugettext_lazy as _  # noqa
+
+from horizon import messages
 from horizon import tabs as horizon_tabs
 
+from tuskar_ui import api as tuskar
 from tuskar_ui.infrastructure.resource_management import tabs
 
 
 class IndexView(horizon_tabs.TabbedTableView):
     tab_group_class = tabs.ResourceManagementTabs
     template_name = 'infrastructure/resource_management/index.html'
+
+    def get(self, request, *args, **kwargs):
+        # the tables resolve the relations of their rows from the snapshot
+        snapshot = tuskar.TopologySnapshot.load(request)
+        if snapshot is not None and snapshot.errors:
+            messages.warning(request, _('Unable to retrieve the flavors of '
+                                        'some resource classes.'))
+        return super(IndexView, self).get(request, *args, **kwargs)
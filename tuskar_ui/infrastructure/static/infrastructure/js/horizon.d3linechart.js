@@ -10,6 +10,8 @@
       data-chart-type - must be "line_chart"
       data-url        - (string) url for the json data for the chart
       data-series     - (string) the list of series separated by comma
+      data-object     - (string) optional, the object the series are of
+                        (e.g. "rack-1"), overall usage by default
 
     Example:
       <div data-chart-type="line_chart"
@@ -22,6 +24,7 @@
       data-chart-type - must be "modal_line_chart"
       data-url        - (string) url for the json data for the chart
       data-series     - (string) the list of series separated by comma
+      data-object     - (string) optional, as above
 
     Example:
       <a data-chart-type="modal_line_chart"
@@ -178,7 +181,8 @@ horizon.d3_line_chart = {
   data: function(element) {
     return {
       url: $(element).data("url"),
-      series: $(element).data("series")
+      series: $(element).data("series"),
+      object: $(element).data("object") || ""
     };
   },
 
@@ -0,0 +1,63 @@
+/*
+  Shows the progress of a rack import, polling its status until it is no
+  longer running.
+
+  Usage:
+    <div class="rack-import" data-url="<import_status url>"
+         data-interval="<milliseconds between two polls>"
+         data-running="true">
+      <p class="rack-import-state"></p>
+      <dl class="rack-import-counts"></dl>
+      <form class="rack-import-resume"></form>
+      <table class="rack-import-rows"><tbody></tbody></table>
+    </div>
+*/
+tuskar.rack_import = {
+  init: function () {
+    $('.rack-import').each(function () {
+      var $import = $(this);
+      if ($import.data('running')) {
+        tuskar.rack_import.poll($import);
+      }
+    });
+  },
+
+  poll: function ($import) {
+    setTimeout(function () {
+      $.getJSON($import.data('url'), function (status) {
+        tuskar.rack_import.update($import, status);
+        if (status.running) {
+          tuskar.rack_import.poll($import);
+        }
+      });
+    }, $import.data('interval'));
+  },
+
+  update: function ($import, status) {
+    var state;
+    if (status.running) {
+      state = gettext('Importing racks...');
+    } else if (status.finished) {
+      state = gettext('The import has finished.');
+    } else {
+      state = gettext('The import was interrupted.');
+    }
+    $import.find('.rack-import-state').text(state);
+
+    var $counts = $import.find('.rack-import-counts').empty();
+    $.each(status.counts, function (name, count) {
+      $counts.append($('<dt>').text(name), $('<dd>').text(count));
+    });
+
+    var $rows = $import.find('.rack-import-rows tbody').empty();
+    $.each(status.rows, function (index, row) {
+      $rows.append($('<tr>').append($('<td>').text(row.name),
+                                    $('<td>').text(row.status),
+                                    $('<td>').text(row.message)));
+    });
+
+    $import.find('.rack-import-resume').toggle(status.resumable);
+  }
+};
+
+horizon.addInitFunction(tuskar.rack_import.init);
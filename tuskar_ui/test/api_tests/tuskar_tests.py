@@ -14,14 +14,36 @@
 
 from __future__ import absolute_import
 
+import threading
+import time
+
+from django.core import cache
+from django import http
+from django.test.utils import override_settings  # noqa
+from django.utils import unittest
+import mox
+
 from novaclient.v1_1.contrib import baremetal
+from novaclient.v1_1 import servers
 
 from tuskar_ui import api
 from tuskar_ui.test import helpers as test
+from tuskar_ui import timeseries
 
 
 class TuskarApiTests(test.APITestCase):
 
+    def test_node_fields(self):
+        node = self.baremetalclient_nodes.first()
+
+        ret_val = api.Node(node, self.request)
+        self.assertEquals(str(node.id), ret_val.id)
+        self.assertEquals(node.pm_address, ret_val.pm_address)
+        self.assertIs(self.request, ret_val.request)
+        # fields are copied, the resource and its manager aren't kept
+        self.assertFalse(hasattr(ret_val, '_apiresource'))
+        self.assertRaises(AttributeError, getattr, ret_val, 'manager')
+
     def test_node_get(self):
         node = self.baremetalclient_nodes.first()
 
@@ -38,6 +60,42 @@ class TuskarApiTests(test.APITestCase):
         ret_val = api.Node.get(self.request, node.id)
         self.assertIsInstance(ret_val, api.Node)
 
+    def test_node_get_paginated_servers(self):
+        node = self.baremetalclient_nodes.first()
+        manager = servers.ServerManager(None)
+        # horizon asks for one server more than a page to tell if there
+        # are more pages
+        first_page = [servers.Server(
+            manager,
+            {'id': str(i),
+             'OS-EXT-SRV-ATTR:hypervisor_hostname': 'other-%s' % i,
+             'OS-EXT-STS:vm_state': 'active'}) for i in range(21)]
+        second_page = [servers.Server(
+            manager,
+            {'id': 'aa',
+             'OS-EXT-SRV-ATTR:hypervisor_hostname': node.id,
+             'OS-EXT-STS:vm_state': 'building'})]
+
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
+        baremetal.BareMetalNodeManager.get(node.id).AndReturn(node)
+
+        novaclient = self.stub_novaclient()
+        novaclient.servers = self.mox.CreateMockAnything()
+        novaclient.servers.list(True,
+                                {'all_tenants': True,
+                                 'limit': 21}).AndReturn(first_page)
+        novaclient.servers.list(True,
+                                {'all_tenants': True,
+                                 'limit': 21,
+                                 'marker': '19'}).AndReturn(second_page)
+        self.mox.ReplayAll()
+
+        ret_val = api.Node.get(self.request, node.id)
+        self.assertEquals('building', ret_val.status)
+        # resolved from the servers walked so far, without listing again
+        details = api.Node._instance_details(self.request, 'other-3')
+        self.assertEquals('active', details.vm_state)
+
     def test_node_create(self):
         node = self.baremetalclient_nodes.first()
 
@@ -76,8 +134,67 @@ class TuskarApiTests(test.APITestCase):
         for node in ret_val:
             self.assertIsInstance(node, api.Node)
 
+    def test_node_list_detailed(self):
+        node_1 = baremetal.BareMetalNode(
+            baremetal.BareMetalNodeManager(None),
+            {'id': '1', 'pm_user': 'user'})
+        node_2 = baremetal.BareMetalNode(
+            baremetal.BareMetalNodeManager(None),
+            {'id': '2', 'pm_user': None})
+        server = servers.Server(
+            servers.ServerManager(None),
+            {'id': 'aa',
+             'addresses': {'ctlplane': [{'addr': '192.0.2.10'}]},
+             'OS-EXT-SRV-ATTR:hypervisor_hostname': '1',
+             'OS-EXT-STS:vm_state': 'active'})
+
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
+        baremetal.BareMetalNodeManager.list().AndReturn([node_1, node_2])
+
+        novaclient = self.stub_novaclient()
+        novaclient.servers = self.mox.CreateMockAnything()
+        novaclient.servers.list(True,
+                                {'all_tenants': True,
+                                 'limit': 21}).AndReturn([server])
+        self.mox.ReplayAll()
+
+        ret_val = api.Node.list_detailed(self.request, ['2', '1'])
+        self.assertEquals(['2', '1'], [node.id for node in ret_val])
+        self.assertEquals('unprovisioned', ret_val[0].status)
+        self.assertEquals('active', ret_val[1].status)
+        self.assertEquals('192.0.2.10', ret_val[1].ip_address_other)
+        self.assertEquals('user/********', ret_val[1].power_management)
+        self.assertIs(ret_val[1], api.Node.get(self.request, '1'))
+
+    def test_node_instance_details_failed_page(self):
+        server_1, server_2 = [servers.Server(
+            servers.ServerManager(None),
+            {'id': server_id,
+             'OS-EXT-SRV-ATTR:hypervisor_hostname': hostname,
+             'OS-EXT-STS:vm_state': 'active'})
+            for server_id, hostname in (('aa', '1'), ('bb', '2'))]
+
+        self.mox.StubOutWithMock(api.nova, 'server_list')
+        api.nova.server_list(self.request, search_opts={'paginate': True},
+                             all_tenants=True).AndReturn(([server_1], True))
+        api.nova.server_list(
+            self.request, search_opts={'paginate': True, 'marker': 'aa'},
+            all_tenants=True).AndRaise(
+                api.tuskar_exceptions.DeadlineExceeded())
+        api.nova.server_list(self.request, search_opts={'paginate': True},
+                             all_tenants=True).AndReturn(([server_1], True))
+        api.nova.server_list(
+            self.request, search_opts={'paginate': True, 'marker': 'aa'},
+            all_tenants=True).AndReturn(([server_2], False))
+        self.mox.ReplayAll()
+
+        self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                          api.Node._instance_details, self.request, '2')
+        # the failed walk isn't taken for the end of the listing
+        self.assertEquals('active', api.Node._instance_details(
+            self.request, '2').vm_state)
+
     def test_node_list_unracked(self):
-        nodes = self.baremetalclient_nodes.list()
         all_nodes = self.baremetalclient_nodes_all.list()
         racks = self.tuskarclient_racks.list()
 
@@ -86,18 +203,7 @@ class TuskarApiTests(test.APITestCase):
 
         tuskarclient = self.stub_tuskarclient()
         tuskarclient.racks = self.mox.CreateMockAnything()
-        tuskarclient.racks.list().MultipleTimes().AndReturn(racks)
-
-        novaclient = self.stub_novaclient()
-        novaclient.servers = self.mox.CreateMockAnything()
-        novaclient.servers.list(True,
-                                {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
-
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).\
-                MultipleTimes().AndReturn(n)
+        tuskarclient.racks.list().AndReturn(racks)
         self.mox.ReplayAll()
 
         ret_val = api.Node.list_unracked(self.request)
@@ -107,7 +213,6 @@ class TuskarApiTests(test.APITestCase):
 
     def test_node_flavors(self):
         node = self.baremetal_nodes.first()
-        nodes = self.baremetalclient_nodes.list()
         racks = self.tuskarclient_racks.list()
         rc = self.tuskarclient_resource_classes.first()
         flavors = self.tuskarclient_flavors.list()
@@ -119,16 +224,6 @@ class TuskarApiTests(test.APITestCase):
         tuskarclient.resource_classes.get(rc.id).AndReturn(rc)
         tuskarclient.flavors = self.mox.CreateMockAnything()
         tuskarclient.flavors.list(rc.id).AndReturn(flavors)
-
-        novaclient = self.stub_novaclient()
-        novaclient.servers = self.mox.CreateMockAnything()
-        novaclient.servers.list(True,
-                                {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
-
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
         self.mox.ReplayAll()
 
         node.request = self.request
@@ -139,22 +234,11 @@ class TuskarApiTests(test.APITestCase):
 
     def test_node_rack(self):
         node = self.baremetal_nodes.first()
-        nodes = self.baremetalclient_nodes.list()
         racks = self.tuskarclient_racks.list()
 
         tuskarclient = self.stub_tuskarclient()
         tuskarclient.racks = self.mox.CreateMockAnything()
         tuskarclient.racks.list().AndReturn(racks)
-
-        novaclient = self.stub_novaclient()
-        novaclient.servers = self.mox.CreateMockAnything()
-        novaclient.servers.list(True,
-                                {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
-
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
         self.mox.ReplayAll()
 
         node.request = self.request
@@ -172,24 +256,53 @@ class TuskarApiTests(test.APITestCase):
 
         self.assertEquals(96, node.remaining_capacity)
 
+    def test_node_running_virtual_machines(self):
+        node = self.baremetal_nodes.first()
+        overcloud = self.mox.CreateMockAnything()
+        overcloud.client = self.mox.CreateMockAnything()
+        overcloud.servers = None
+        self.mox.StubOutWithMock(api, 'overcloudclient')
+        api.overcloudclient(self.request).MultipleTimes().AndReturn(overcloud)
+        overcloud.client.get(mox.StrContains('/servers/detail?')).AndReturn(
+            (None, {'servers': [{'id': '1', 'hostId': node.id},
+                                {'id': '2', 'hostId': 'other'},
+                                {'id': '3', 'hostId': node.id}]}))
+        self.mox.ReplayAll()
+
+        node.request = self.request
+        vms = node.running_virtual_machines
+        self.assertEquals(['1', '3'], [vm.id for vm in vms])
+        self.assertEquals(2, node.running_virtual_machines_count)
+
+    def test_node_running_virtual_machines_count(self):
+        node = self.baremetal_nodes.first()
+        overcloud = self.mox.CreateMockAnything()
+        overcloud.client = self.mox.CreateMockAnything()
+        self.mox.StubOutWithMock(api, 'overcloudclient')
+        api.overcloudclient(self.request).MultipleTimes().AndReturn(overcloud)
+        # nova returns less than asked for, with a link to the next page
+        overcloud.client.get(mox.StrContains('/servers/detail?')).AndReturn(
+            (None, {'servers': [{'id': '1', 'hostId': node.id},
+                                {'id': '2', 'hostId': 'other'}],
+                    'servers_links': [{'rel': 'next',
+                                       'href': '/servers/detail?marker=2'}]}))
+        overcloud.client.get(mox.StrContains('marker=2')).AndReturn(
+            (None, {'servers': [{'id': '3', 'hostId': node.id}]}))
+        self.mox.ReplayAll()
+
+        node.request = self.request
+        self.assertEquals(2, node.running_virtual_machines_count)
+        # the counts are shared by all the nodes of the request
+        other = api.Node(self.baremetalclient_nodes.list()[1], self.request)
+        self.assertEquals(0, other.running_virtual_machines_count)
+
     def test_node_is_provisioned(self):
         node = self.baremetal_nodes.first()
-        nodes = self.baremetalclient_nodes.list()
         racks = self.tuskarclient_racks.list()
 
         tuskarclient = self.stub_tuskarclient()
         tuskarclient.racks = self.mox.CreateMockAnything()
         tuskarclient.racks.list().AndReturn(racks)
-
-        novaclient = self.stub_novaclient()
-        novaclient.servers = self.mox.CreateMockAnything()
-        novaclient.servers.list(True,
-                                {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
-
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
         self.mox.ReplayAll()
 
         node.request = self.request
@@ -283,6 +396,260 @@ class TuskarApiTests(test.APITestCase):
             self.assertIsInstance(rack, api.Rack)
         self.assertEquals(2, rc.racks_count)
 
+    def test_resource_class_racks_errors(self):
+        rc = self.tuskar_resource_classes.first()
+        racks = self.tuskarclient_racks.list()
+        error = Exception('rack 1 is gone')
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.get('1').AndRaise(error)
+        tuskarclient.racks.get('2').AndReturn(racks[1])
+        self.mox.ReplayAll()
+
+        self.assertEquals(['2'], [rack.id for rack in rc.list_racks])
+        self.assertEquals([('1', error)], rc.racks_errors)
+
+    def test_resource_class_racks_all_failed(self):
+        rc = self.tuskar_resource_classes.first()
+        error = Exception('racks are gone')
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.get('1').AndRaise(error)
+        tuskarclient.racks.get('2').AndRaise(error)
+        self.mox.ReplayAll()
+
+        self.assertRaises(Exception, lambda: rc.list_racks)
+
+    @override_settings(TUSKAR_API_MAX_WORKERS=4)
+    def test_fan_out(self):
+        def load(item):
+            if item % 3 == 0:
+                raise ValueError(item)
+            return item * 2
+
+        results, errors = api._fan_out(load, range(1, 11))
+        self.assertEquals([2, 4, None, 8, 10, None, 14, 16, None, 20],
+                          results)
+        self.assertEquals([3, 6, 9], [item for item, error in errors])
+
+    @override_settings(TUSKAR_API_MAX_WORKERS=4)
+    def test_gather(self):
+        def fail():
+            raise ValueError()
+
+        self.assertEquals([1, 2], api._gather(lambda: 1, lambda: 2))
+        self.assertRaises(ValueError, api._gather, lambda: 1, fail)
+
+    def test_coalesce(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def load():
+            calls.append(None)
+            started.set()
+            release.wait()
+            return ['rack']
+
+        results = []
+
+        def read():
+            results.append(api._coalesce(None, ('racks',), load))
+        threads = [threading.Thread(target=read) for i in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        # let the others join the read in progress
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(1, len(calls))
+        self.assertEquals([['rack']] * 5, results)
+        # reads after it are made again
+        self.assertEquals(['rack'], api._coalesce(None, ('racks',), load))
+        self.assertEquals(2, len(calls))
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=10)
+    def test_coalesce_request_errors(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def load():
+            started.set()
+            release.wait()
+            raise api.tuskar_exceptions.DeadlineExceeded()
+
+        def lead():
+            self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                              api._coalesce, None, ('racks',), load)
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait()
+        try:
+            # followers don't wait past their own budget
+            self.request._tuskar_deadline = time.time() + 0.05
+            self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                              api._coalesce, self.request, ('racks',),
+                              lambda: ['rack'])
+            # and load it themselves when the first one ran out of time
+            threading.Timer(0.05, release.set).start()
+            self.assertEquals(['rack'], api._coalesce(None, ('racks',),
+                                                      lambda: ['rack']))
+        finally:
+            release.set()
+            leader.join()
+
+    @unittest.skipIf(api.eventlet is None, "eventlet isn't installed.")
+    @override_settings(TUSKAR_API_MAX_WORKERS=4,
+                       TUSKAR_API_CONCURRENCY='eventlet')
+    def test_fan_out_eventlet(self):
+        results, errors = api._fan_out(lambda item: item * 2, range(1, 11))
+        self.assertEquals(range(2, 22, 2), results)
+        self.assertEquals([], errors)
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=0, TUSKAR_CALL_TIMEOUT=5,
+                       TUSKAR_HEDGE_DELAY=0.05)
+    def test_budgeted_call_hedged(self):
+        calls = []
+
+        def get():
+            calls.append(None)
+            if len(calls) == 1:
+                time.sleep(1)
+                return 'slow'
+            return 'fast'
+
+        self.assertEquals('fast', api._budgeted_call(self.request, True, get))
+        self.assertEquals(2, len(calls))
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=0, TUSKAR_CALL_TIMEOUT=0.05)
+    def test_budgeted_call_timeout(self):
+        self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                          api._budgeted_call, self.request, True,
+                          time.sleep, 1)
+        self.assertTrue(self.request._tuskar_degraded)
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=10, TUSKAR_CALL_TIMEOUT=0.05)
+    def test_budgeted_call_write(self):
+        def write():
+            time.sleep(0.1)
+            return 'written'
+
+        # writes aren't cut short, only not started out of budget
+        self.assertEquals('written',
+                          api._budgeted_call(self.request, False, write))
+        self.request._tuskar_deadline = time.time()
+        self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                          api._budgeted_call, self.request, False, write)
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=10)
+    def test_request_budget(self):
+        manager = self.mox.CreateMockAnything()
+        manager.list().AndReturn([])
+        self.mox.ReplayAll()
+
+        client = api._Budgeted(manager, self.request)
+        self.assertEquals([], client.list())
+        # once the budget is spent, calls fail without being made
+        self.request._tuskar_deadline = time.time() - 1
+        self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                          client.list)
+        self.assertTrue(self.request._tuskar_degraded)
+        self.assertEquals([], api.Node.list_unracked(self.request))
+
+    def test_circuit_breaker(self):
+        test.stub_timeseries_dir(self)
+        breaker = api.CircuitBreaker('baremetal test', 2, 30)
+        manager = self.mox.CreateMockAnything()
+        manager.list().AndReturn(['node'])
+        manager.list().AndRaise(IOError())
+        manager.get('1').AndRaise(IOError())
+        manager.list().AndReturn(['other node'])
+        self.mox.ReplayAll()
+
+        client = api._Budgeted(manager, self.request, breaker=breaker)
+        self.assertEquals(['node'], client.list())
+        self.assertRaises(IOError, client.list)
+        self.assertEquals(api.CircuitBreaker.CLOSED, breaker.state)
+        self.assertRaises(IOError, client.get, '1')
+        self.assertEquals(api.CircuitBreaker.OPEN, breaker.state)
+        self.assertEquals(1, timeseries.latest('circuit_breaker-baremetal '
+                                               'test', 'state'))
+
+        # while open, reads get their last answer and the rest fail fast
+        self.assertEquals(['node'], client.list())
+        self.assertRaises(api.tuskar_exceptions.CircuitOpen, client.get, '1')
+        self.assertTrue(self.request._tuskar_unavailable)
+        self.assertEquals({'calls': 5, 'failures': 2, 'rejected': 2,
+                           'served_last_good': 1}, breaker.stats)
+
+        # then a probe closes it again
+        breaker._opened_at -= 30
+        self.assertEquals(['other node'], client.list())
+        self.assertEquals(api.CircuitBreaker.CLOSED, breaker.state)
+
+    @override_settings(TUSKAR_REQUEST_BUDGET=10)
+    def test_circuit_breaker_out_of_budget(self):
+        breaker = api.CircuitBreaker('baremetal test', 1, 30)
+
+        # a spent budget doesn't reach the breaker
+        self.request._tuskar_deadline = time.time() - 1
+        self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                          api._guarded_call, self.request, breaker, (),
+                          'get',
+                          time.sleep, 0)
+        self.assertEquals(0, breaker.stats['calls'])
+        # nor does a call cut short by it count as a failure
+        self.request._tuskar_deadline = time.time() + 0.05
+        self.assertRaises(api.tuskar_exceptions.DeadlineExceeded,
+                          api._guarded_call, self.request, breaker, (),
+                          'get',
+                          time.sleep, 1)
+        self.assertEquals(0, breaker.stats['failures'])
+        self.assertEquals(api.CircuitBreaker.CLOSED, breaker.state)
+
+    @override_settings(TUSKAR_BREAKER_FAILURES=3)
+    def test_circuit_breaker_server_list(self):
+        self.mox.stubs.Set(api, 'BREAKERS', {})
+        self.mox.StubOutWithMock(api.nova, 'server_list')
+        api.nova.server_list(self.request, search_opts={'paginate': True},
+                             all_tenants=True).AndReturn(([], False))
+        self.mox.ReplayAll()
+
+        self.assertEquals([], list(api._server_list(self.request)))
+        breaker, = api.BREAKERS.values()
+        # the last page is kept by token and options, not by request
+        (scope, args, kwargs), = breaker._last_good.keys()
+        user = self.request.user
+        token_key = api.ClientPool.key('nova', user.token.id, user.tenant_id,
+                                       getattr(user, 'services_region', None))
+        self.assertEquals((token_key, 'servers', 'list'), scope)
+        self.assertEquals('()', args)
+
+    def test_circuit_breaker_last_good_size(self):
+        self.mox.stubs.Set(api, 'BREAKER_LAST_GOOD_SIZE', 2)
+        breaker = api.CircuitBreaker('baremetal test', 1, 30)
+        breaker.call(lambda: 'a', 'a')
+        breaker.call(lambda: 'b', 'b')
+        breaker.call(lambda: 'a', 'a')
+        breaker.call(lambda: 'c', 'c')
+        # the least recently used answer is dropped
+        self.assertEquals(['a', 'c'], sorted(breaker._last_good))
+
+    def test_circuit_breaker_client_errors(self):
+        breaker = api.CircuitBreaker('baremetal test', 1, 30)
+
+        def get():
+            error = IOError()
+            error.code = 404
+            raise error
+        self.assertRaises(IOError, breaker.call, get)
+        self.assertEquals(api.CircuitBreaker.CLOSED, breaker.state)
+
     def test_resource_class_all_racks(self):
         rc = self.tuskar_resource_classes.first()
         racks = self.tuskarclient_racks.list()
@@ -301,17 +668,18 @@ class TuskarApiTests(test.APITestCase):
         rc = self.tuskar_resource_classes.first()
         racks = self.tuskarclient_racks.list()
         rack_ids = [rack.id for rack in racks]
-        rack_data = [{'id': rack_id} for rack_id in rack_ids]
 
         tuskarclient = self.stub_tuskarclient()
-        tuskarclient.resource_classes = self.mox.CreateMockAnything()
-        tuskarclient.resource_classes.update(rc.id,
-                                             racks=[])
-        tuskarclient.resource_classes.update(rc.id,
-                                             racks=rack_data)
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.update('3', resource_class={'id': rc.id})
+        tuskarclient.racks.update('1', resource_class=None)
         self.mox.ReplayAll()
 
-        rc.set_racks(self.request, rack_ids)
+        # racks 1 and 2 are already in the class
+        rc.set_racks(self.request, rack_ids[1:])
+        self.assertEquals(['2', '3'], rc.racks_ids)
+        # unchanged membership doesn't reach tuskar
+        rc.set_racks(self.request, ['3', '2'])
 
     def test_resource_class_nodes(self):
         rc = self.tuskar_resource_classes.first()
@@ -323,15 +691,14 @@ class TuskarApiTests(test.APITestCase):
         tuskarclient.racks.get('1').AndReturn(racks[0])
         tuskarclient.racks.get('2').AndReturn(racks[1])
 
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
+        baremetal.BareMetalNodeManager.list().AndReturn(nodes)
 
         novaclient = self.stub_novaclient()
         novaclient.servers = self.mox.CreateMockAnything()
         novaclient.servers.list(True,
                                 {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
+                                 'limit': 21}).AndReturn([])
         self.mox.ReplayAll()
 
         rc.request = self.request
@@ -339,6 +706,19 @@ class TuskarApiTests(test.APITestCase):
             self.assertIsInstance(node, api.Node)
         self.assertEquals(4, rc.nodes_count)
 
+    def test_resource_class_nodes_count(self):
+        rc = self.tuskar_resource_classes.first()
+        racks = self.tuskarclient_racks.list()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.list().AndReturn(racks)
+        self.mox.ReplayAll()
+
+        rc.request = self.request
+        self.assertEquals(2, rc.racks_count)
+        self.assertEquals(4, rc.nodes_count)
+
     def test_resource_class_flavors(self):
         rc = self.tuskar_resource_classes.first()
         flavors = self.tuskarclient_flavors.list()
@@ -365,6 +745,94 @@ class TuskarApiTests(test.APITestCase):
         for capacity in rc.capacities:
             self.assertIsInstance(capacity, api.Capacity)
         self.assertEquals(2, len(rc.capacities))
+        self.assertEquals([('total_cpu', 65, 'CPU'),
+                           ('total_memory', 1028, 'MB')],
+                          [(c.name, c.value, c.unit) for c in rc.capacities])
+
+    def test_aggregate_capacities(self):
+        capacities = [[api.Capacity({'name': 'memory', 'value': '1',
+                                     'unit': 'GB'}),
+                       api.Capacity({'name': 'cpu', 'value': '4',
+                                     'unit': 'CPU'})],
+                      [api.Capacity({'name': 'cpu', 'value': '2',
+                                     'unit': 'CPU'}),
+                       api.Capacity({'name': 'memory', 'value': '512',
+                                     'unit': 'MB'})]]
+
+        def aggregate():
+            return [(c.name, c.value, c.unit, c.min, c.max, c.mean)
+                    for c in api._aggregate_capacities(capacities)]
+        expected = [('memory', 1.5, 'GB', 0.5, 1, 0.75),
+                    ('cpu', 6, 'CPU', 2, 4, 3)]
+        self.assertEquals(expected, aggregate())
+
+    def test_timeseries(self):
+        test.stub_timeseries_dir(self)
+        midnight = 100 * timeseries.WEEK
+        hour, day = timeseries.HOUR, timeseries.DAY
+        now = midnight + 12 * hour
+
+        self.assertEquals([(now, None), (now - hour, None)],
+                          timeseries.values('rack-1', 'cpu', hour, 2, now))
+        self.assertEquals(None, timeseries.latest('rack-1', 'cpu', now))
+
+        timeseries.record('rack-1', 'cpu', 8, now - day - timeseries.WEEK)
+        # a week later, the same hourly slot starts over
+        timeseries.record('rack-1', 'cpu', 2, now - day)
+        timeseries.record('rack-1', 'cpu', 4, now - day + 60)
+        timeseries.record('rack-1', 'cpu', 6, now - hour)
+        timeseries.record('rack-2', 'cpu', 100, now)
+
+        self.assertEquals([(now, None), (now - hour, 6)],
+                          timeseries.values('rack-1', 'cpu', hour, 2, now))
+        self.assertEquals(3, dict(timeseries.values(
+            'rack-1', 'cpu', hour, 25, now))[now - day])
+        self.assertEquals([(midnight, 6), (midnight - day, 3)],
+                          timeseries.values('rack-1', 'cpu', day, 2, now))
+        self.assertEquals(6, timeseries.latest('rack-1', 'cpu', now))
+        self.assertEquals(4.5, timeseries.average('rack-1', 'cpu', now=now))
+        self.assertEquals(None, timeseries.latest('rack-1', 'memory', now))
+        self.assertRaises(ValueError, timeseries.values,
+                          'rack-1', 'cpu', hour, 24 * 7 + 1, now)
+
+        # the coarsest resolution filling the points, among those keeping
+        # the start of the range
+        self.assertEquals(hour, timeseries.resolution(now - day, now, 24, now))
+        self.assertEquals(day, timeseries.resolution(now - day, now, 1, now))
+        self.assertEquals(timeseries.WEEK, timeseries.resolution(
+            now - 365 * day, now, 50, now))
+        self.assertEquals(day, timeseries.resolution(
+            now - 365 * day, now, 400, now))
+        timestamps, means = timeseries.between('rack-1', 'cpu',
+                                               now - day, now, hour)
+        self.assertEquals(25, len(timestamps))
+        self.assertEquals([3, 6, None], [means[0]] + means[-2:])
+
+    def test_timeseries_open_series(self):
+        test.stub_timeseries_dir(self)
+        self.mox.stubs.Set(timeseries, 'MAX_OPEN_SERIES', 2)
+        timeseries.record('rack-1', 'cpu', 1)
+        timeseries.record('rack-2', 'cpu', 2)
+        timeseries.latest('rack-1', 'cpu')
+        timeseries.record('rack-3', 'cpu', 3)
+
+        # the least recently used series was closed, and is opened again
+        self.assertEquals([('rack-1', 'cpu'), ('rack-3', 'cpu')],
+                          sorted(timeseries._series))
+        self.assertEquals(2, timeseries.latest('rack-2', 'cpu'))
+        self.assertEquals(2, len(timeseries._series))
+
+    def test_capacity_usage(self):
+        test.stub_timeseries_dir(self)
+        capacity = api.Capacity({'name': 'cpu', 'value': 64, 'unit': 'CPU'})
+        capacity.object_id = 'rack-1'
+        timeseries.record('rack-1', 'cpu', 10)
+        timeseries.record('rack-1', 'cpu', 15)
+        timeseries.record('overall', 'cpu', 50)
+
+        self.assertEquals(12.5, capacity.usage)
+        self.assertEquals(12.5, capacity.average)
+        self.assertEquals(0, api.Capacity({'name': 'memory'}).usage)
 
     def test_resource_class_total_instances(self):
         rc = self.tuskar_resource_classes.first()
@@ -425,16 +893,15 @@ class TuskarApiTests(test.APITestCase):
         tuskarclient.racks.get('1').AndReturn(racks[0])
         tuskarclient.racks.get('2').AndReturn(racks[1])
 
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
         nodes = self.baremetalclient_nodes.list()
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
+        baremetal.BareMetalNodeManager.list().AndReturn(nodes)
 
         novaclient = self.stub_novaclient()
         novaclient.servers = self.mox.CreateMockAnything()
         novaclient.servers.list(True,
                                 {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
+                                 'limit': 21}).AndReturn([])
 
         self.mox.ReplayAll()
 
@@ -465,6 +932,116 @@ class TuskarApiTests(test.APITestCase):
         ret_val = api.Rack.get(self.request, rack.id)
         self.assertIsInstance(ret_val, api.Rack)
 
+    def test_rack_get_identity_map(self):
+        racks = self.tuskarclient_racks.list()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.list().AndReturn(racks)
+        tuskarclient.racks.get(racks[1].id).AndReturn(racks[1])
+        self.mox.ReplayAll()
+
+        ret_val = api.Rack.list(self.request)
+        self.assertIs(ret_val[0], api.Rack.get(self.request, racks[0].id))
+        self.assertEquals(len(ret_val), len(api.Rack.list(self.request)))
+
+        # writes drop everything loaded so far in the request
+        api._invalidate(self.request)
+        rack = api.Rack.get(self.request, racks[1].id)
+        self.assertIs(rack, api.Rack.get(self.request, racks[1].id))
+
+    @override_settings(TUSKAR_CACHE_TTLS={'racks': 60})
+    def test_rack_list_cache(self):
+        racks = self.tuskarclient_racks.list()
+        rack = self.tuskarclient_racks.first()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.list().AndReturn(racks)
+        tuskarclient.racks.delete(rack.id)
+        tuskarclient.racks.list().AndReturn(racks[1:])
+        self.mox.ReplayAll()
+
+        cache.cache.clear()
+        self.assertEquals(3, len(api.Rack.list(self.request)))
+        # another request is served from the cache
+        self.assertEquals(3, len(api.Rack.list(http.HttpRequest())))
+
+        api.Rack.delete(http.HttpRequest(), rack.id)
+        self.assertEquals(2, len(api.Rack.list(http.HttpRequest())))
+
+    @override_settings(TUSKAR_CACHE_TTLS={'racks': 60})
+    def test_list_cache_write_while_loading(self):
+        racks = self.tuskarclient_racks.list()
+
+        def load():
+            # a write lands while the listing is loaded
+            api._invalidate(None, 'racks')
+            return racks
+
+        cache.cache.clear()
+        self.assertEquals(3, len(api._cached_list(None, 'racks', load)))
+        # the listing predates the write, it isn't served after it
+        self.assertEquals(2, len(api._cached_list(None, 'racks',
+                                                  lambda: racks[1:])))
+
+    @override_settings(TUSKAR_CACHE_TTLS={'racks': 60},
+                       TUSKAR_CACHE_MAX_STALENESS=60)
+    def test_rack_list_stale(self):
+        racks = self.tuskarclient_racks.list()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.list().AndReturn(racks)
+        tuskarclient.racks.list().AndReturn(racks[1:])
+        self.mox.ReplayAll()
+
+        cache.cache.clear()
+        self.assertEquals(3, len(api.Rack.list(self.request)))
+        key = api._list_cache_key('racks')
+        stored_at, entries = cache.cache.get(key)
+        cache.cache.set(key, (stored_at - 90, entries))
+        # the expired listing is served, and reloaded (here, in the request)
+        self.assertEquals(3, len(api.Rack.list(http.HttpRequest())))
+        self.assertEquals(2, len(api.Rack.list(http.HttpRequest())))
+
+    @override_settings(TUSKAR_CACHE_TTLS={'overcloud_vm_counts': 0})
+    def test_warm_cache(self):
+        resource_classes = self.tuskarclient_resource_classes.list()
+        racks = self.tuskarclient_racks.list()
+        flavors = self.tuskarclient_flavors.list()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.resource_classes = self.mox.CreateMockAnything()
+        tuskarclient.resource_classes.list().AndReturn(resource_classes)
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.list().AndReturn(racks)
+        tuskarclient.flavors = self.mox.CreateMockAnything()
+        tuskarclient.flavors.list('1').AndReturn(flavors)
+        tuskarclient.flavors.list('2').AndReturn([])
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
+        nodes = self.baremetalclient_nodes.list()
+        baremetal.BareMetalNodeManager.list().AndReturn(nodes)
+        self.mox.stubs.Set(api, 'OVERCLOUD_CREDS', False)
+        self.mox.stubs.Set(api, 'REMOTE_NOVA_BAREMETAL_CREDS', {
+            'auth_url': 'http://baremetal:5000/v2.0',
+            'bypass_url': 'http://baremetal:8774/v2',
+            'user': 'admin',
+            'password': 'secret',
+            'tenant': 'admin'})
+        self.mox.ReplayAll()
+
+        cache.cache.clear()
+        self.assertEquals({'resource_classes': 2, 'racks': 3, 'flavors': 2,
+                           'nodes': len(nodes)},
+                          api.warm_cache())
+        # requests are served from the cache
+        request = http.HttpRequest()
+        self.assertEquals(3, len(api.Rack.list(request)))
+        rc = api.ResourceClass.list(request)[0]
+        self.assertEquals(2, len(rc.list_flavors))
+        self.assertEquals(len(nodes), len(api.Node.list(request)))
+
     def test_rack_create(self):
         rack = self.tuskarclient_racks.first()
 
@@ -485,6 +1062,27 @@ class TuskarApiTests(test.APITestCase):
                                   subnet='192.168.1.0/24')
         self.assertIsInstance(ret_val, api.Rack)
 
+    def test_rack_create_failed(self):
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.create(name='rack1',
+                                  location='location',
+                                  subnet='192.168.1.0/24',
+                                  nodes=[],
+                                  resource_class={'id': 1},
+                                  slots=0).AndRaise(self.exceptions.tuskar)
+        self.mox.ReplayAll()
+
+        generation = api._cache_generation('racks')
+        self.assertRaises(type(self.exceptions.tuskar), api.Rack.create,
+                          request=self.request,
+                          name='rack1',
+                          resource_class_id=1,
+                          location='location',
+                          subnet='192.168.1.0/24')
+        # the rack may have been created anyway
+        self.assertNotEqual(generation, api._cache_generation('racks'))
+
     def test_rack_update(self):
         rack = self.tuskarclient_racks.first()
 
@@ -513,15 +1111,14 @@ class TuskarApiTests(test.APITestCase):
         rack = self.tuskar_racks.first()
         nodes = self.baremetalclient_nodes.list()
 
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
+        baremetal.BareMetalNodeManager.list().AndReturn(nodes)
 
         novaclient = self.stub_novaclient()
         novaclient.servers = self.mox.CreateMockAnything()
         novaclient.servers.list(True,
                                 {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
+                                 'limit': 21}).AndReturn([])
         self.mox.ReplayAll()
 
         rack.request = self.request
@@ -638,16 +1235,15 @@ class TuskarApiTests(test.APITestCase):
         rack = self.tuskar_racks.first()
         rack.request = self.request
 
-        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'get')
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
         nodes = self.baremetalclient_nodes.list()
-        for n in nodes:
-            baremetal.BareMetalNodeManager.get(n.id).AndReturn(n)
+        baremetal.BareMetalNodeManager.list().AndReturn(nodes)
 
         novaclient = self.stub_novaclient()
         novaclient.servers = self.mox.CreateMockAnything()
         novaclient.servers.list(True,
                                 {'all_tenants': True,
-                                 'limit': 21}).MultipleTimes().AndReturn([])
+                                 'limit': 21}).AndReturn([])
 
         self.mox.ReplayAll()
 
@@ -655,6 +1251,20 @@ class TuskarApiTests(test.APITestCase):
             self.assertIsInstance(node, api.Node)
         self.assertEquals(0, len(rack.aggregated_alerts))
 
+    def test_client_pool(self):
+        pool = api.ClientPool(size=2, idle_timeout=60)
+        client = pool.get('a', object)
+        self.assertIs(client, pool.get('a', object))
+
+        pool.get('b', object)
+        pool.get('c', object)
+        self.assertEquals(2, len(pool))
+
+        # idle clients are rebuilt
+        pool.idle_timeout = -1
+        client = pool.get('c', object)
+        self.assertIsNot(client, pool.get('c', object))
+
     def test_flavor_create(self):
         flavor = self.tuskarclient_flavors.first()
 
@@ -686,6 +1296,75 @@ class TuskarApiTests(test.APITestCase):
                           resource_class_id=rc.id,
                           flavor_id=flavor.id)
 
+    def test_flavor_update(self):
+        rc = self.tuskarclient_resource_classes.first()
+        flavor = self.tuskarclient_flavors.first()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.flavors = self.mox.CreateMockAnything()
+        tuskarclient.flavors.update(rc.id, flavor.id,
+                                    name='nano',
+                                    max_vms=100,
+                                    capacities=[]).AndReturn(flavor)
+        self.mox.ReplayAll()
+
+        ret_val = api.Flavor.update(self.request,
+                                    resource_class_id=rc.id,
+                                    flavor_id=flavor.id,
+                                    name='nano',
+                                    max_vms=100,
+                                    capacities=[])
+        self.assertIsInstance(ret_val, api.Flavor)
+
+    def test_flavor_reconcile(self):
+        rc = self.tuskarclient_resource_classes.first()
+        flavors = self.tuskarclient_flavors.list()
+        nano = {'id': '1',
+                'name': 'nano',
+                'max_vms': 100,
+                'capacities': [dict(c, value=str(c['value']))
+                               for c in flavors[0].capacities]}
+        huge = {'id': '2', 'name': 'huge', 'max_vms': 10, 'capacities': []}
+        tiny = {'name': 'tiny', 'max_vms': None, 'capacities': []}
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.flavors = self.mox.CreateMockAnything()
+        tuskarclient.flavors.list(rc.id).AndReturn(flavors)
+        tuskarclient.flavors.update(rc.id, '2',
+                                    name='huge',
+                                    max_vms=10,
+                                    capacities=[])
+        tuskarclient.flavors.create(rc.id,
+                                    name='tiny',
+                                    max_vms=None,
+                                    capacities=[])
+        self.mox.ReplayAll()
+
+        changes = api.Flavor.reconcile(self.request, rc.id,
+                                       [nano, huge, tiny])
+        self.assertEquals(api.FlavorChanges(created=['tiny'],
+                                            updated=['huge'],
+                                            deleted=[],
+                                            unchanged=['nano'],
+                                            errors=[]),
+                          changes)
+
+    def test_flavor_reconcile_delete(self):
+        rc = self.tuskarclient_resource_classes.first()
+        flavors = self.tuskarclient_flavors.list()
+        error = Exception('flavor in use')
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.flavors = self.mox.CreateMockAnything()
+        tuskarclient.flavors.list(rc.id).AndReturn(flavors)
+        tuskarclient.flavors.delete(rc.id, '1').AndRaise(error)
+        tuskarclient.flavors.delete(rc.id, '2')
+        self.mox.ReplayAll()
+
+        changes = api.Flavor.reconcile(self.request, rc.id, [])
+        self.assertEquals(['large'], changes.deleted)
+        self.assertEquals([(('delete', 'nano'), error)], changes.errors)
+
     def test_flavor_cpu(self):
         flavor = self.tuskar_flavors.first()
 
@@ -720,3 +1399,91 @@ class TuskarApiTests(test.APITestCase):
         swap_disk = flavor.swap_disk
         self.assertIsInstance(swap_disk, api.Capacity)
         self.assertEquals(2, swap_disk.value)
+
+    def test_flavor_vms_over_time(self):
+        test.stub_timeseries_dir(self)
+        flavor = self.tuskar_flavors.first()
+        now = time.time()
+        timeseries.record('flavor-%s' % flavor.id, 'vms', 3, now)
+
+        # a day fills 24 points hourly
+        timestamps, values = flavor.vms_over_time(now - timeseries.DAY, now,
+                                                  24)
+        self.assertEquals(timeseries.HOUR, timestamps[1] - timestamps[0])
+        self.assertEquals(25, len(values))
+        self.assertEquals(3, values[-1])
+        self.assertEquals(set([0]), set(values[:-1]))
+
+        # a year is read daily, not hour by hour
+        timestamps, values = flavor.vms_over_time(
+            now - 365 * timeseries.DAY, now, 100)
+        self.assertEquals(timeseries.DAY, timestamps[1] - timestamps[0])
+        self.assertEquals(3, values[-1])
+
+        # no more buckets than are kept, however long the range
+        timestamps, values = flavor.vms_over_time(0, 2.5e11, 100)
+        self.assertEquals(104, len(values))
+        self.assertEquals(3, values[-1])
+
+    def test_topology_snapshot(self):
+        resource_classes = self.tuskarclient_resource_classes.list()
+        racks = self.tuskarclient_racks.list()
+        flavors = self.tuskarclient_flavors.list()
+
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.resource_classes = self.mox.CreateMockAnything()
+        tuskarclient.resource_classes.list().AndReturn(resource_classes)
+        tuskarclient.racks = self.mox.CreateMockAnything()
+        tuskarclient.racks.list().AndReturn(racks)
+        tuskarclient.flavors = self.mox.CreateMockAnything()
+        tuskarclient.flavors.list('1').AndReturn(flavors)
+        tuskarclient.flavors.list('2').AndReturn([])
+
+        self.mox.StubOutWithMock(baremetal.BareMetalNodeManager, 'list')
+        baremetal.BareMetalNodeManager.list().AndReturn(
+            self.baremetalclient_nodes_all.list())
+
+        novaclient = self.stub_novaclient()
+        novaclient.servers = self.mox.CreateMockAnything()
+        novaclient.servers.list(True,
+                                {'all_tenants': True,
+                                 'limit': 21}).AndReturn([])
+        self.mox.ReplayAll()
+
+        snapshot = api.TopologySnapshot.load(self.request)
+        self.assertIs(snapshot, api.TopologySnapshot.get(self.request))
+        self.assertIs(snapshot, api.TopologySnapshot.loaded(self.request))
+        self.assertEquals(['1', '2'], [rack.id for rack in
+                                       snapshot.racks_by_resource_class['1']])
+        self.assertEquals(['3'], [rack.id for rack in snapshot.free_racks])
+        self.assertEquals(['1'], [rack.id for rack in
+                                  snapshot.racks_by_state['active']])
+        self.assertEquals('1', snapshot.rack_by_node['4'].id)
+        self.assertEquals(['5'], [node.id for node in
+                                  snapshot.unracked_nodes])
+        self.assertEquals(5, len(snapshot.nodes_by_state['unprovisioned']))
+        self.assertEquals(2, len(snapshot.flavors_by_resource_class['1']))
+
+        # relations resolve from the snapshot, without further calls
+        rc = api.ResourceClass.get(self.request, '1')
+        self.assertIs(snapshot.resource_classes_by_id['1'], rc)
+        self.assertEquals(['1', '2'], [rack.id for rack in rc.list_racks])
+        self.assertEquals(['1', '2', '3', '4'],
+                          [node.id for node in rc.nodes])
+        self.assertEquals(2, len(rc.list_flavors))
+        rack = api.Rack.get(self.request, '1')
+        self.assertIs(rc, rack.get_resource_class)
+        self.assertEquals(4, len(rack.list_nodes))
+        self.assertIs(rack, api.Node.get(self.request, '1').rack)
+        self.assertIs(None, api.Node.get(self.request, '5').rack)
+        self.assertIs(snapshot.flavors_by_resource_class['1'][0],
+                      api.Flavor.get(self.request, '1', '1'))
+
+    def test_topology_snapshot_error(self):
+        tuskarclient = self.stub_tuskarclient()
+        tuskarclient.resource_classes = self.mox.CreateMockAnything()
+        tuskarclient.resource_classes.list().AndRaise(self.exceptions.tuskar)
+        self.mox.ReplayAll()
+
+        self.assertIs(None, api.TopologySnapshot.load(self.request))
+        self.assertIs(None, api.TopologySnapshot.loaded(self.request))
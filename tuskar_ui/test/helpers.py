@@ -13,6 +13,8 @@
 #    under the License.
 
 import os
+import shutil
+import tempfile
 
 from django.core.handlers import wsgi
 from django.utils import unittest
@@ -23,6 +25,7 @@ from tuskarclient.v1 import client as tuskar_client
 from openstack_dashboard.test import helpers as openstack_dashboard_helpers
 from tuskar_ui import api as tuskar_api
 from tuskar_ui.test.test_data import utils as test_data_utils
+from tuskar_ui import timeseries
 
 
 # Makes output of failing mox tests much easier to read.
@@ -33,6 +36,24 @@ def create_stubs(stubs_to_create={}):
     return openstack_dashboard_helpers.create_stubs(stubs_to_create)
 
 
+def stub_directory(test_case, module, name):
+    """Points the ``name`` directory setting of ``module`` at a temporary
+    directory, removed after ``test_case``, and returns it.
+    """
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory)
+    test_case.mox.stubs.Set(module, name, directory)
+    return directory
+
+
+def stub_timeseries_dir(test_case):
+    """Keeps the time series recorded by ``test_case`` in a temporary
+    directory.
+    """
+    stub_directory(test_case, timeseries, 'TIMESERIES_DIR')
+    test_case.mox.stubs.Set(timeseries, '_series', {})
+
+
 @unittest.skipIf(os.environ.get('SKIP_UNITTESTS', False),
                      "The SKIP_UNITTESTS env variable is set.")
 class TestCase(openstack_dashboard_helpers.TestCase):
@@ -144,3 +144,26 @@ OVERCLOUD_CREDS = {
     'tenant': 'admin',
     'auth_url': 'http://localhost:5000/v2.0/',
 }
+
+# Every test stubs its own backend responses, don't let them leak between
+# tests through the shared listing cache.
+TUSKAR_CACHE_TTLS = {
+    'racks': 0,
+    'resource_classes': 0,
+    'flavors': 0,
+    'nodes': 0,
+    'overcloud_vm_counts': 0,
+}
+
+# Keep backend calls in the order the mox expectations are recorded in.
+TUSKAR_API_MAX_WORKERS = 1
+
+# Run rack imports in the request, so their backend calls hit the stubs.
+TUSKAR_BACKGROUND_JOBS = False
+
+# Call the stubs directly, without time limits.
+TUSKAR_REQUEST_BUDGET = 0
+TUSKAR_CALL_TIMEOUT = 0
+
+# Don't let failures stubbed in one test open circuits in the next ones.
+TUSKAR_BREAKER_FAILURES = 0
@@ -0,0 +1,232 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Usage time series, kept on local disk.
+
+Every (object, metric) series is a memory-mapped file of fixed size, holding
+a ring buffer per resolution (hourly, daily and weekly). Recording a sample
+adds it to the current bucket of each of them, so reading an interval only
+reads the buckets of the resolution it is charted at, however many samples
+were recorded. The files are locked while read or written, so that several
+processes can record the same series.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import django.conf
+
+
+TIMESERIES_DIR = getattr(django.conf.settings, 'TUSKAR_TIMESERIES_DIR',
+                         os.path.join(tempfile.gettempdir(),
+                                      'tuskar_ui_timeseries'))
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+# seconds per bucket, and number of buckets kept
+RESOLUTIONS = ((HOUR, 7 * 24),
+               (DAY, 366),
+               (WEEK, 2 * 52))
+# bucket number, sum and count of the samples recorded in it
+SLOT = struct.Struct('<qdq')
+
+_offsets = {}
+_slots = 0
+for _seconds, _count in RESOLUTIONS:
+    _offsets[_seconds] = _slots
+    _slots += _count
+SERIES_SIZE = _slots * SLOT.size
+# Most series kept open (a descriptor and a mapping each) by a process, the
+# least recently used one is closed first.
+MAX_OPEN_SERIES = 64
+
+# (object_id, metric): (descriptor, mapping, number of their last use)
+_series = {}
+_uses = itertools.count()
+_lock = threading.Lock()
+
+
+def _path(object_id, metric):
+    return os.path.join(TIMESERIES_DIR,
+                        hashlib.sha1(repr((object_id, metric))).hexdigest())
+
+
+def _open(object_id, metric, create=False):
+    """Returns the descriptor and the mapping of the file of the series, or
+    None when it doesn't exist and isn't to be created. The caller holds
+    _lock for as long as it uses them.
+    """
+    key = (object_id, metric)
+    if key not in _series:
+        path = _path(object_id, metric)
+        if not create and not os.path.exists(path):
+            return None
+        if not os.path.isdir(TIMESERIES_DIR):
+            os.makedirs(TIMESERIES_DIR, 0o700)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with _locked(fd, fcntl.LOCK_EX):
+                if os.fstat(fd).st_size < SERIES_SIZE:
+                    os.ftruncate(fd, SERIES_SIZE)
+            series = mmap.mmap(fd, SERIES_SIZE)
+        except Exception:
+            os.close(fd)
+            raise
+        while _series and len(_series) >= MAX_OPEN_SERIES:
+            _close(min(_series, key=lambda k: _series[k][2]))
+    else:
+        fd, series, last_used = _series[key]
+    _series[key] = (fd, series, next(_uses))
+    return fd, series
+
+
+def _close(key):
+    fd, series, last_used = _series.pop(key)
+    series.close()
+    os.close(fd)
+
+
+@contextlib.contextmanager
+def _locked(fd, operation):
+    # the lock of this process' threads is held as well, flock doesn't tell
+    # them apart
+    fcntl.flock(fd, operation)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _slot_offset(seconds, bucket):
+    count = dict(RESOLUTIONS)[seconds]
+    return (_offsets[seconds] + bucket % count) * SLOT.size
+
+
+def record(object_id, metric, value, timestamp=None):
+    """Records a sample of ``metric`` of ``object_id``."""
+    if timestamp is None:
+        timestamp = time.time()
+    with _lock:
+        fd, series = _open(object_id, metric, create=True)
+        with _locked(fd, fcntl.LOCK_EX):
+            for seconds, count in RESOLUTIONS:
+                bucket = int(timestamp // seconds)
+                offset = _slot_offset(seconds, bucket)
+                stored, total, samples = SLOT.unpack_from(series, offset)
+                if stored != bucket:
+                    # the slot still holds a bucket from a previous round
+                    total, samples = 0.0, 0
+                SLOT.pack_into(series, offset, bucket, total + value,
+                               samples + 1)
+
+
+def _read(object_id, metric, seconds, buckets):
+    """Returns the mean of each of ``buckets`` of ``seconds``, None for
+    those without samples.
+    """
+    means = []
+    with _lock:
+        opened = _open(object_id, metric)
+        if opened is None:
+            return [None] * len(buckets)
+        fd, series = opened
+        with _locked(fd, fcntl.LOCK_SH):
+            for bucket in buckets:
+                stored, total, samples = SLOT.unpack_from(
+                    series, _slot_offset(seconds, bucket))
+                if stored == bucket and samples:
+                    means.append(total / samples)
+                else:
+                    means.append(None)
+    return means
+
+
+def values(object_id, metric, seconds, points, now=None):
+    """Returns ``(timestamp, mean)`` for each of the last ``points`` buckets
+    of ``seconds`` (one of RESOLUTIONS), newest first. The mean is None for
+    the buckets without samples.
+    """
+    if points > dict(RESOLUTIONS)[seconds]:
+        raise ValueError('Only %d buckets of %d seconds are kept' %
+                         (dict(RESOLUTIONS)[seconds], seconds))
+    if now is None:
+        now = time.time()
+    current = int(now // seconds)
+    buckets = range(current, current - points, -1)
+    return zip([bucket * seconds for bucket in buckets],
+               _read(object_id, metric, seconds, buckets))
+
+
+def resolution(start, end, points, now=None):
+    """Returns the coarsest of RESOLUTIONS still having ``points`` buckets
+    between the ``start`` and ``end`` timestamps, among those keeping
+    ``start``. Falls back to the finest of those, or to the coarsest
+    resolution when none keeps ``start``.
+    """
+    if now is None:
+        now = time.time()
+    kept = [seconds for seconds, count in RESOLUTIONS
+            if int(start // seconds) > int(now // seconds) - count]
+    if not kept:
+        return RESOLUTIONS[-1][0]
+    for seconds in reversed(kept):
+        if (end - start) // seconds >= points:
+            return seconds
+    return kept[0]
+
+
+def between(object_id, metric, start, end, seconds, now=None):
+    """Returns the timestamps of the buckets of ``seconds`` from ``start``
+    to ``end``, oldest first, and the means of those buckets, as two lists.
+
+    Only the buckets still kept, up to the current one, are returned.
+    """
+    if now is None:
+        now = time.time()
+    current = int(now // seconds)
+    buckets = range(max(int(start // seconds),
+                        current - dict(RESOLUTIONS)[seconds] + 1),
+                    min(int(end // seconds), current) + 1)
+    return ([bucket * seconds for bucket in buckets],
+            _read(object_id, metric, seconds, buckets))
+
+
+def latest(object_id, metric, now=None):
+    """Mean of the samples of the last hour that has some, or None."""
+    for timestamp, value in values(object_id, metric, HOUR, 2, now):
+        if value is not None:
+            return value
+    return None
+
+
+def average(object_id, metric, seconds=DAY, points=7, now=None):
+    """Mean of the last ``points`` buckets of ``seconds`` that have
+    samples, or None.
+    """
+    means = [value for timestamp, value in
+             values(object_id, metric, seconds, points, now)
+             if value is not None]
+    if not means:
+        return None
+    return sum(means) / len(means)